@@ -1,20 +1,77 @@
 import streamlit as st
-from utils import summerizer
+from knowledge_base import file_hash
+from utils import summerizer, load_knowledge_base, answer_question, warm_up, SUMMARY_MODES
+
+# Load LangChain and the Gemini clients in the background while the page renders.
+warm_up()
+
+# Number of documents whose knowledge bases are kept in memory for Q&A, shared by all sessions.
+QA_MAX_DOCUMENTS = 16
+
+
+@st.cache_resource(show_spinner=False, max_entries=QA_MAX_DOCUMENTS)
+def get_knowledge_base(doc_hash, _doc_file):
+    """
+    Loads or builds a document's knowledge base once per file hash and keeps it in memory,
+    so follow-up questions skip extraction and embedding. Errors are raised rather than
+    returned so they are not cached.
+    """
+    KnowledgeBase, error = load_knowledge_base(_doc_file, doc_hash)
+    if error:
+        raise ValueError(error)
+    return KnowledgeBase
+
 
 st.set_page_config(page_title='PDF & Word Document Summarizer')
 st.title('PDF & Word Document Summarizer App')
-st.write('Summarize your PDF or Word files in just a few seconds...')
+st.write('Summarize your PDF or Word files in just a few seconds, then ask questions about them.')
 st.divider()
 
 doc_file = st.file_uploader('Upload your PDF or Word Document...', type=['pdf', 'docx'])
-submit = st.button('Generate Summary')
+summary_tab, qa_tab = st.tabs(['Summary', 'Q&A'])
 
-if submit:
-    if doc_file is not None:
-        with st.spinner("Generating summary... This might take a moment."):
-            response = summerizer(doc_file)
+with summary_tab:
+    mode = st.radio('Summarization mode', list(SUMMARY_MODES), format_func=SUMMARY_MODES.get, horizontal=True)
+    max_workers = 4
+    if mode == 'map_reduce':
+        max_workers = st.slider('Parallel LLM calls', min_value=1, max_value=16, value=4)
+    refresh = st.checkbox('Regenerate (ignore cached summary)')
+    submit = st.button('Generate Summary')
 
-        st.subheader('Summary of file:')
-        st.write(response)
+    if submit:
+        if doc_file is not None:
+            with st.spinner("Generating summary... This might take a moment."):
+                response = summerizer(doc_file, mode=mode, max_workers=max_workers, refresh=refresh)
+
+            st.subheader('Summary of file:')
+            st.write(response)
+        else:
+            st.warning("Please upload a PDF or Word document first.")
+
+with qa_tab:
+    if doc_file is None:
+        st.info("Upload a PDF or Word document to ask questions about it.")
     else:
-        st.warning("Please upload a PDF or Word document first.")
+        doc_hash = file_hash(doc_file)
+        history = st.session_state.setdefault('qa_history', {}).setdefault(doc_hash, [])
+
+        for question, answer in history:
+            st.markdown(f"**Q:** {question}")
+            st.write(answer)
+
+        with st.form('qa_form', clear_on_submit=True):
+            question = st.text_input('Ask a question about the document')
+            ask = st.form_submit_button('Ask')
+
+        if ask:
+            if question.strip():
+                with st.spinner("Searching the document..."):
+                    try:
+                        answer = answer_question(get_knowledge_base(doc_hash, doc_file), question)
+                    except ValueError as e:
+                        answer = str(e)
+                history.append((question, answer))
+                st.markdown(f"**Q:** {question}")
+                st.write(answer)
+            else:
+                st.warning("Please enter a question.")
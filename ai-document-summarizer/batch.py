@@ -0,0 +1,182 @@
+"""
+Summarize folders of PDF and Word documents from the command line.
+
+Examples:
+    python batch.py reports/ --output summaries.jsonl
+    python batch.py "dumps/2024-*/**/*.pdf" --output nightly.jsonl --extract-workers 4 --llm-workers 8 --resume
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from knowledge_base import file_hash
+from utils import (
+    SUMMARY_MODES,
+    get_summary_cache,
+    load_knowledge_base,
+    summarize_knowledge_base,
+    summary_cache_key,
+)
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.docx')
+
+
+def find_documents(inputs):
+    """
+    Expands directories (recursively) and glob patterns into a sorted list of PDF and DOCX paths.
+
+    Args:
+        inputs (list[str]): Files, directories or glob patterns.
+
+    Returns:
+        list[str]: Absolute paths of the matching documents, without duplicates.
+    """
+    paths = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                paths.update(os.path.join(root, name) for name in files)
+        else:
+            paths.update(glob.glob(item, recursive=True) or [item])
+    return sorted(
+        os.path.abspath(path) for path in paths
+        if os.path.isfile(path) and path.lower().endswith(SUPPORTED_EXTENSIONS)
+    )
+
+
+def read_completed(output_path, mode, retry_errors=False):
+    """
+    Reads the paths already present in an earlier JSONL output, so a run can resume where it stopped.
+
+    Args:
+        output_path (str): The JSONL file written by a previous run.
+        mode (str): Only count files summarized in this mode as completed.
+        retry_errors (bool): Do not count failed files as completed.
+
+    Returns:
+        set[str]: Paths that do not need to be processed again.
+    """
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A run that was killed mid-write can leave a truncated last line.
+                continue
+            if record.get("mode") != mode:
+                continue
+            if record.get("status") == "ok" or not retry_errors:
+                completed.add(record["path"])
+    return completed
+
+
+class BatchSummarizer:
+    """
+    Summarizes many documents concurrently. Extraction/indexing and LLM summarization are two
+    stages with their own concurrency limits, so slow parsing never starves the LLM stage and
+    a burst of finished extractions never exceeds the LLM call budget.
+    """
+
+    def __init__(self, mode="retrieval", extract_workers=2, llm_workers=4, pdf_workers=1):
+        self.mode = mode
+        self.pdf_workers = pdf_workers
+        self._extract_slots = threading.Semaphore(extract_workers)
+        self._llm_slots = threading.Semaphore(llm_workers)
+        self.workers = extract_workers + llm_workers
+
+    def summarize(self, path):
+        """
+        Summarizes one file.
+
+        Returns:
+            dict: The JSONL record for the file.
+        """
+        started = time.perf_counter()
+        record = {"path": path, "mode": self.mode}
+        try:
+            with open(path, 'rb') as doc_file:
+                doc_hash = file_hash(doc_file)
+                record["sha256"] = doc_hash
+
+                summaries = get_summary_cache()
+                cache_key = summary_cache_key(doc_hash, self.mode)
+                summary = summaries.get(cache_key)
+
+                if summary is None:
+                    with self._extract_slots:
+                        KnowledgeBase, error = load_knowledge_base(doc_file, doc_hash, self.pdf_workers)
+                    if error:
+                        raise RuntimeError(error)
+                    with self._llm_slots:
+                        # Each file holds a single LLM slot, so map-reduce runs its calls one at a time.
+                        summary = summarize_knowledge_base(KnowledgeBase, self.mode, max_workers=1)
+                    summaries.put(cache_key, doc_hash, summary)
+
+            record.update(status="ok", summary=summary)
+        except Exception as e:
+            record.update(status="error", error=str(e))
+        record["seconds"] = round(time.perf_counter() - started, 3)
+        return record
+
+    def run(self, paths, output_path):
+        """
+        Summarizes `paths` concurrently and appends one JSON line per file to `output_path`
+        as soon as that file finishes.
+
+        Returns:
+            tuple[int, int]: The number of files that succeeded and failed.
+        """
+        succeeded = failed = 0
+        with open(output_path, "a", encoding="utf-8") as output, \
+                ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(self.summarize, path) for path in paths]
+            for done, future in enumerate(as_completed(futures), start=1):
+                record = future.result()
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                output.flush()
+                if record["status"] == "ok":
+                    succeeded += 1
+                else:
+                    failed += 1
+                print(f"[{done}/{len(paths)}] {record['status']:5} {record['seconds']:7.1f}s  {record['path']}", file=sys.stderr)
+        return succeeded, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize PDF and Word documents in bulk.")
+    parser.add_argument("inputs", nargs="+", help="Files, directories or glob patterns (quote them to use ** recursion).")
+    parser.add_argument("-o", "--output", default="summaries.jsonl", help="JSONL file to append results to.")
+    parser.add_argument("--mode", choices=list(SUMMARY_MODES), default="retrieval")
+    parser.add_argument("--extract-workers", type=int, default=2, help="Files extracted and indexed at the same time.")
+    parser.add_argument("--llm-workers", type=int, default=4, help="Concurrent LLM summarization calls.")
+    parser.add_argument("--pdf-workers", type=int, default=1, help="Processes used to extract pages of each large PDF.")
+    parser.add_argument("--resume", action="store_true", help="Skip files already present in the output file.")
+    parser.add_argument("--retry-errors", action="store_true", help="With --resume, process files that failed before again.")
+    args = parser.parse_args(argv)
+
+    paths = find_documents(args.inputs)
+    if args.resume:
+        completed = read_completed(args.output, args.mode, retry_errors=args.retry_errors)
+        paths = [path for path in paths if path not in completed]
+
+    if not paths:
+        print("No documents to summarize.", file=sys.stderr)
+        return 0
+
+    print(f"Summarizing {len(paths)} documents into {args.output}", file=sys.stderr)
+    batch = BatchSummarizer(args.mode, args.extract_workers, args.llm_workers, args.pdf_workers)
+    succeeded, failed = batch.run(paths, args.output)
+    print(f"Done: {succeeded} succeeded, {failed} failed.", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
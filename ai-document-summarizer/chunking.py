@@ -0,0 +1,187 @@
+import re
+import zlib
+from bisect import bisect_right
+
+# Sentence ends (punctuation followed by whitespace) and paragraph breaks (blank lines).
+_BOUNDARY = re.compile(r'(?<=[.!?])["\')\]]*\s+|\n[ \t]*\n\s*')
+_WORD = re.compile(r'\S+\s*')
+
+# Once a chunk is at least ANCHOR_FILL_RATIO full it is closed after the next anchor sentence.
+# Anchors are picked from the sentence text alone, on average one per ANCHOR_SPACING_RATIO * chunk_tokens
+# (sentences that end a paragraph are PARAGRAPH_ANCHOR_WEIGHT times as likely to be anchors), so chunk
+# boundaries re-align shortly after an edit and unchanged parts of a new document version produce the
+# same chunks as before.
+ANCHOR_FILL_RATIO = 0.5
+ANCHOR_SPACING_RATIO = 0.3
+PARAGRAPH_ANCHOR_WEIGHT = 4
+
+
+def count_tokens(text):
+    """
+    Estimates how many tokens a piece of text uses with Gemini-style subword tokenizers,
+    without calling the API.
+
+    English prose averages roughly 4 characters or 0.75 words per token; taking the larger of the
+    two estimates keeps dense text (numbers, code, tables) from being undercounted.
+
+    Args:
+        text (str): The text to measure.
+
+    Returns:
+        int: The estimated token count.
+    """
+    if not text:
+        return 0
+    words = len(text.split())
+    return max(1, len(text) // 4, (words * 4 + 2) // 3)
+
+
+class _Segment:
+    __slots__ = ("text", "offset", "tokens", "paragraph_end")
+
+    def __init__(self, text, offset, paragraph_end=False):
+        self.text = text
+        self.offset = offset
+        self.tokens = count_tokens(text)
+        self.paragraph_end = paragraph_end
+
+    def is_anchor(self, spacing_tokens):
+        # A sentence is an anchor with probability proportional to its length.
+        weight = self.tokens * (PARAGRAPH_ANCHOR_WEIGHT if self.paragraph_end else 1)
+        return zlib.crc32(self.text.strip().encode("utf-8")) % spacing_tokens < weight
+
+
+def _split_words(segment, max_tokens):
+    """
+    Splits a segment that is larger than a whole chunk into word-aligned pieces.
+    Runs of text without any whitespace are cut every `max_tokens * 4` characters.
+    """
+    text = segment.text
+    max_chars = max_tokens * 4
+    cuts = []
+    tokens = 0
+    for match in _WORD.finditer(text):
+        word_start = match.start()
+        word_tokens = count_tokens(match.group())
+        if tokens and tokens + word_tokens > max_tokens:
+            cuts.append(word_start)
+            tokens = 0
+        while word_tokens > max_tokens:
+            word_start += max_chars
+            cuts.append(word_start)
+            word_tokens = count_tokens(text[word_start:match.end()])
+        tokens += word_tokens
+
+    pieces = []
+    for begin, end in zip([0] + cuts, cuts + [len(text)]):
+        if begin < end:
+            pieces.append(_Segment(text[begin:end], segment.offset + begin))
+    pieces[-1].paragraph_end = segment.paragraph_end
+    return pieces
+
+
+def iter_token_chunks(records, chunk_tokens=800, overlap_tokens=80):
+    """
+    Splits a stream of extracted text records into chunks measured in tokens.
+
+    Text is cut at sentence and paragraph boundaries and packed up to `chunk_tokens`, so chunks
+    come out close to the target size regardless of how the source uses newlines. Once a chunk is
+    mostly full it is closed at the next paragraph break or content-defined anchor sentence, which
+    keeps chunk boundaries stable between versions of a document. The trailing sentences of each
+    chunk (up to `overlap_tokens`) are repeated at the start of the next one. Sentences longer than
+    a whole chunk are split between words.
+
+    Args:
+        records (Iterable[dict]): Records with "kind", "index", "offset" and "text" keys,
+            e.g. from `iter_pdf_pages` or `iter_docx_blocks`.
+        chunk_tokens (int): Target (and maximum) chunk size in estimated tokens.
+        overlap_tokens (int): Maximum number of tokens repeated between consecutive chunks.
+
+    Yields:
+        tuple[str, dict]: The chunk text and its metadata: the character "offset" where it starts,
+        the page, paragraph or table it starts in, and its estimated "tokens".
+    """
+    anchor_spacing = max(1, int(chunk_tokens * ANCHOR_SPACING_RATIO))
+    starts = []
+    sources = []
+    pending = ''
+    pending_offset = 0
+    current = []
+    current_tokens = 0
+    # Whether `current` holds anything beyond the overlap carried over from the last chunk.
+    fresh = False
+
+    def source_of(offset):
+        kind, index = sources[max(bisect_right(starts, offset) - 1, 0)]
+        return kind, index
+
+    def emit():
+        nonlocal current, current_tokens, fresh
+        text = ''.join(segment.text for segment in current).strip()
+        first = current[0]
+        kind, index = source_of(first.offset)
+        chunk = (text, {"offset": first.offset, kind: index, "tokens": current_tokens})
+
+        tail = []
+        tail_tokens = 0
+        for segment in reversed(current[1:]):
+            if tail_tokens + segment.tokens > overlap_tokens:
+                break
+            tail.insert(0, segment)
+            tail_tokens += segment.tokens
+        current, current_tokens = tail, tail_tokens
+        fresh = False
+        return chunk
+
+    def pack(segment):
+        nonlocal current_tokens, fresh
+        pieces = [segment] if segment.tokens <= chunk_tokens else _split_words(segment, chunk_tokens)
+        for piece in pieces:
+            if current and current_tokens + piece.tokens > chunk_tokens:
+                yield emit()
+                # Drop the overlap if it leaves no room for the next piece.
+                while current and current_tokens + piece.tokens > chunk_tokens:
+                    current_tokens -= current.pop(0).tokens
+            current.append(piece)
+            current_tokens += piece.tokens
+            fresh = True
+            if current_tokens >= chunk_tokens * ANCHOR_FILL_RATIO and piece.is_anchor(anchor_spacing):
+                yield emit()
+
+    def segments(final):
+        nonlocal pending, pending_offset
+        position = 0
+        for match in _BOUNDARY.finditer(pending):
+            end = match.end()
+            if end == len(pending) and not final:
+                # Trailing whitespace may grow into a paragraph break with the next record.
+                break
+            yield _Segment(pending[position:end], pending_offset + position, match.group().count('\n') >= 2)
+            position = end
+        rest = pending[position:]
+        if final or count_tokens(rest) > 2 * chunk_tokens:
+            # Flush text without any boundary (e.g. tables) instead of buffering it forever.
+            if rest.strip():
+                yield _Segment(rest, pending_offset + position)
+            position = len(pending)
+        pending = pending[position:]
+        pending_offset += position
+
+    for record in records:
+        if not pending:
+            pending_offset = record["offset"]
+        pending += record["text"]
+        starts.append(record["offset"])
+        sources.append((record["kind"], record["index"]))
+        for segment in segments(final=False):
+            yield from pack(segment)
+        # Forget sources that no buffered text can refer to any more.
+        oldest = min([pending_offset] + [segment.offset for segment in current])
+        first = max(bisect_right(starts, oldest) - 1, 0)
+        del starts[:first]
+        del sources[:first]
+
+    for segment in segments(final=True):
+        yield from pack(segment)
+    if fresh and any(segment.text.strip() for segment in current):
+        yield emit()
@@ -0,0 +1,172 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+
+from langchain_core.embeddings import Embeddings
+
+# SQLite refuses statements with more bound parameters than this on older builds.
+_SQLITE_BATCH = 500
+
+
+class EmbeddingCache:
+    """
+    A persistent, content-addressed store of embedding vectors backed by SQLite.
+
+    Each vector is keyed by a hash of the embedding model name and the exact chunk text,
+    so the same chunk is only ever embedded once per model. The store is bounded to
+    `max_entries` vectors and evicts the least recently used ones first.
+    """
+
+    def __init__(self, path, max_entries=100_000):
+        """
+        Args:
+            path (str): Location of the SQLite database file. Parent folders are created if needed.
+            max_entries (int): Maximum number of vectors to keep on disk.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model_name, text):
+        """
+        Builds the content address of a chunk for a given embedding model.
+
+        Args:
+            model_name (str): The embedding model name, e.g. "models/embedding-001".
+            text (str): The exact chunk text.
+
+        Returns:
+            str: A hex SHA-256 digest.
+        """
+        return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys):
+        """
+        Looks up several vectors at once and marks the hits as recently used.
+
+        Args:
+            keys (Iterable[str]): Keys produced by `make_key`.
+
+        Returns:
+            dict: Maps each key that was found to its vector (list of floats).
+        """
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        now = time.time()
+        with self._lock:
+            for start in range(0, len(keys), _SQLITE_BATCH):
+                batch = keys[start:start + _SQLITE_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+            if found:
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+                self._conn.commit()
+        return found
+
+    def put_many(self, items):
+        """
+        Stores several vectors and evicts the least recently used entries if the cache is full.
+
+        Args:
+            items (dict): Maps keys produced by `make_key` to vectors (sequences of floats).
+        """
+        if not items:
+            return
+        now = time.time()
+        rows = [(key, array("f", vector).tobytes(), now) for key, vector in items.items()]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                (overflow,),
+            )
+
+    def __len__(self):
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        return count
+
+    def clear(self):
+        """Removes every stored vector."""
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps a LangChain embeddings client so that only chunks missing from an `EmbeddingCache`
+    are sent to the embedding API.
+    """
+
+    def __init__(self, embeddings, model_name, cache):
+        """
+        Args:
+            embeddings (Embeddings): The underlying client, e.g. `GoogleGenerativeAIEmbeddings`.
+            model_name (str): The model name used to namespace cache keys.
+            cache (EmbeddingCache): The on-disk store to read from and write to.
+        """
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cache = cache
+
+    def embed_documents(self, texts):
+        keys = [EmbeddingCache.make_key(self.model_name, text) for text in texts]
+        vectors = self.cache.get_many(keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+
+        if missing:
+            new_vectors = self.embeddings.embed_documents(list(missing.values()))
+            fresh = dict(zip(missing.keys(), new_vectors))
+            self.cache.put_many(fresh)
+            vectors.update(fresh)
+
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text):
+        # Query and document embeddings use different task types, so they get their own namespace.
+        key = EmbeddingCache.make_key(f"{self.model_name}:query", text)
+        cached = self.cache.get_many([key])
+        if key in cached:
+            return cached[key]
+        vector = self.embeddings.embed_query(text)
+        self.cache.put_many({key: vector})
+        return vector
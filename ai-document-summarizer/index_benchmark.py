@@ -0,0 +1,143 @@
+"""
+Measures recall against memory for the knowledge base index types in `vector_index`,
+using the summarizer's own chunks and (cached) embeddings.
+
+Examples:
+    python index_benchmark.py                       # every knowledge base saved in the cache
+    python index_benchmark.py reports/ --k 10 --nprobe 1,4,16,64
+"""
+import argparse
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+from batch import find_documents
+from knowledge_base import ordered_documents
+from utils import get_embeddings, get_knowledge_base_registry, load_knowledge_base
+from vector_index import INDEX_TYPES, build_index, index_description, index_size_bytes
+
+
+def load_chunk_texts(inputs):
+    """
+    Collects the chunk texts of the given documents, or of every knowledge base saved in the
+    cache when no inputs are given. Documents that were not indexed yet are indexed first.
+
+    Args:
+        inputs (list[str]): Files, directories or glob patterns.
+
+    Returns:
+        list[str]: The chunk texts of all documents.
+    """
+    registry = get_knowledge_base_registry()
+    embeddings = get_embeddings()
+    knowledge_bases = []
+    if inputs:
+        for path in find_documents(inputs):
+            with open(path, 'rb') as doc_file:
+                KnowledgeBase, error = load_knowledge_base(doc_file)
+            if error:
+                print(f"Skipping {path}: {error}", file=sys.stderr)
+                continue
+            knowledge_bases.append(KnowledgeBase)
+    else:
+        for doc_hash in sorted(os.listdir(registry.root)):
+            if registry.exists(doc_hash):
+                KnowledgeBase = registry.load(doc_hash, embeddings)
+                if KnowledgeBase is not None:
+                    knowledge_bases.append(KnowledgeBase)
+
+    return [
+        document.page_content
+        for KnowledgeBase in knowledge_bases
+        for _, document in ordered_documents(KnowledgeBase)
+    ]
+
+
+def recall_at_k(found, expected):
+    """
+    Returns the fraction of the exact nearest neighbours that an approximate search also found.
+    """
+    k = expected.shape[1]
+    hits = sum(len(set(row_found[:k]) & set(row_expected)) for row_found, row_expected in zip(found, expected))
+    return hits / expected.size
+
+
+def benchmark(vectors, queries, k=5, nprobes=(1, 4, 16)):
+    """
+    Builds every index type with and without IVF partitioning and measures it against exact search.
+
+    Args:
+        vectors (np.ndarray): The indexed embeddings.
+        queries (np.ndarray): Held-out embeddings used as queries.
+        k (int): Number of neighbours retrieved per query.
+        nprobes (Iterable[int]): IVF partitions searched per query, one result row each.
+
+    Returns:
+        list[dict]: One row per configuration with its "index_type", index "description", "bytes" in memory,
+        "build_seconds", "query_ms" per query and "recall".
+    """
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, expected = exact.search(queries, k)
+
+    rows = []
+    for index_type in INDEX_TYPES:
+        for partitioned in (False, True):
+            ivf_min_vectors = 0 if partitioned else len(vectors) + 1
+            description = index_description(index_type, vectors.shape[1], len(vectors), ivf_min_vectors)
+            started = time.perf_counter()
+            index = build_index(vectors, index_type, ivf_min_vectors)
+            build_seconds = time.perf_counter() - started
+            ivf = faiss.try_extract_index_ivf(index)
+            for nprobe in (nprobes if ivf is not None else [None]):
+                if ivf is not None:
+                    ivf.nprobe = min(nprobe, ivf.nlist)
+                started = time.perf_counter()
+                _, found = index.search(queries, k)
+                query_ms = (time.perf_counter() - started) * 1000 / len(queries)
+                rows.append({
+                    "index_type": index_type,
+                    "description": description if ivf is None else f"{description}, nprobe={ivf.nprobe}",
+                    "bytes": index_size_bytes(index),
+                    "build_seconds": build_seconds,
+                    "query_ms": query_ms,
+                    "recall": recall_at_k(found, expected),
+                })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare recall and memory of knowledge base index types.")
+    parser.add_argument("inputs", nargs="*", help="Documents to benchmark on (default: every cached knowledge base).")
+    parser.add_argument("--queries", type=int, default=200, help="Chunks held out and used as queries.")
+    parser.add_argument("--k", type=int, default=5, help="Neighbours retrieved per query.")
+    parser.add_argument("--nprobe", default="1,4,16", help="Comma-separated IVF partitions searched per query.")
+    args = parser.parse_args(argv)
+
+    texts = load_chunk_texts(args.inputs)
+    query_count = min(args.queries, len(texts) // 10)
+    if query_count < 1 or len(texts) - query_count < args.k:
+        print("ERROR: Not enough chunks to benchmark. Index some documents first.", file=sys.stderr)
+        return 1
+
+    vectors = np.array(get_embeddings().embed_documents(texts), dtype="float32")
+    order = np.random.default_rng(0).permutation(len(vectors))
+    queries, vectors = vectors[order[:query_count]], vectors[order[query_count:]]
+
+    rows = benchmark(vectors, queries, args.k, [int(n) for n in args.nprobe.split(",")])
+    flat_bytes = rows[0]["bytes"]
+    print(f"{len(vectors)} chunks ({vectors.shape[1]} dimensions), {query_count} queries, recall@{args.k}\n")
+    print(f"{'type':8} {'index':32} {'MB':>9} {'ratio':>6} {'build s':>8} {'ms/query':>9} {'recall':>7}")
+    for row in rows:
+        print(
+            f"{row['index_type']:8} {row['description']:32} {row['bytes'] / 2**20:9.2f} "
+            f"{flat_bytes / row['bytes']:5.1f}x {row['build_seconds']:8.2f} {row['query_ms']:9.3f} {row['recall']:7.1%}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
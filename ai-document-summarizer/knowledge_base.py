@@ -0,0 +1,247 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+INDEX_FILE = "index.faiss"
+CHUNKS_FILE = "chunks.json"
+VERSIONS_FILE = "versions.json"
+
+
+def file_hash(doc_file):
+    """
+    Computes the SHA-256 content hash of an uploaded or opened document.
+
+    Args:
+        doc_file: A binary file-like object, e.g. a Streamlit `UploadedFile`.
+
+    Returns:
+        str: The hex digest of the file contents. The read position is restored afterwards.
+    """
+    position = doc_file.tell()
+    doc_file.seek(0)
+    digest = hashlib.sha256()
+    for block in iter(lambda: doc_file.read(1024 * 1024), b''):
+        digest.update(block)
+    doc_file.seek(position)
+    return digest.hexdigest()
+
+
+def chunk_hash(text):
+    """
+    Computes the content hash used to match chunks between versions of a document.
+
+    Args:
+        text (str): The chunk text.
+
+    Returns:
+        str: The hex SHA-256 digest of the text.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def indexed_documents(knowledge_base):
+    """
+    Lists the documents stored in a FAISS knowledge base in index order, so the n-th pair
+    belongs to the n-th vector of the index.
+
+    Args:
+        knowledge_base (FAISS): The vector store to read.
+
+    Returns:
+        list[tuple[str, Document]]: Pairs of docstore id and document.
+    """
+    documents = []
+    for position in range(knowledge_base.index.ntotal):
+        doc_id = knowledge_base.index_to_docstore_id[position]
+        documents.append((doc_id, knowledge_base.docstore.search(doc_id)))
+    return documents
+
+
+def ordered_documents(knowledge_base):
+    """
+    Lists the documents stored in a FAISS knowledge base in the order their chunks appear
+    in the source document (by their "offset" metadata, falling back to index order).
+    After an incremental update this differs from the index order.
+
+    Args:
+        knowledge_base (FAISS): The vector store to read.
+
+    Returns:
+        list[tuple[str, Document]]: Pairs of docstore id and document.
+    """
+    documents = indexed_documents(knowledge_base)
+    documents.sort(key=lambda item: item[1].metadata.get("offset", 0))
+    return documents
+
+
+class KnowledgeBaseRegistry:
+    """
+    Saves FAISS knowledge bases to disk under the content hash of their source document
+    and loads them back, memory-mapping the index where FAISS supports it.
+
+    Each knowledge base lives in `<root>/<doc_hash>/` as a raw FAISS index plus a JSON file
+    holding the chunk texts and metadata in index order. The registry also remembers the latest
+    version (content hash) seen for each document name, so a new version can be indexed
+    incrementally from the previous one.
+    """
+
+    def __init__(self, root):
+        """
+        Args:
+            root (str): Folder that holds one sub-folder per saved knowledge base.
+        """
+        self.root = root
+        self._versions_lock = threading.Lock()
+        self._save_locks = {}
+        self._save_locks_lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def path_for(self, doc_hash):
+        return os.path.join(self.root, doc_hash)
+
+    def exists(self, doc_hash):
+        folder = self.path_for(doc_hash)
+        return os.path.isfile(os.path.join(folder, INDEX_FILE)) and os.path.isfile(os.path.join(folder, CHUNKS_FILE))
+
+    def load(self, doc_hash, embeddings, writable=False):
+        """
+        Loads the knowledge base saved for a document, if there is one.
+
+        Args:
+            doc_hash (str): The content hash of the source document.
+            embeddings (Embeddings): The embeddings client used to embed queries against the index.
+            writable (bool): Read the index into memory instead of memory-mapping it read-only,
+                so chunks can be added to or removed from it.
+
+        Returns:
+            FAISS | None: The restored vector store, or None if nothing usable is saved for this hash.
+        """
+        if not self.exists(doc_hash):
+            return None
+
+        # Imported here so that hashing a file and checking the summary cache does not load FAISS or LangChain.
+        import faiss
+        from langchain_community.docstore.in_memory import InMemoryDocstore
+        from langchain_community.vectorstores import FAISS
+        from langchain_core.documents import Document
+
+        folder = self.path_for(doc_hash)
+        index_path = os.path.join(folder, INDEX_FILE)
+        index = None
+        if not writable:
+            try:
+                index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+            except RuntimeError:
+                # Not every index type can be memory-mapped; fall back to a regular read.
+                pass
+        if index is None:
+            index = faiss.read_index(index_path)
+
+        with open(os.path.join(folder, CHUNKS_FILE), encoding="utf-8") as f:
+            chunks = json.load(f)
+
+        if len(chunks) != index.ntotal:
+            return None
+
+        docstore = InMemoryDocstore({
+            chunk["id"]: Document(page_content=chunk["text"], metadata=chunk.get("metadata", {}))
+            for chunk in chunks
+        })
+        index_to_docstore_id = {position: chunk["id"] for position, chunk in enumerate(chunks)}
+        return FAISS(
+            embedding_function=embeddings,
+            index=index,
+            docstore=docstore,
+            index_to_docstore_id=index_to_docstore_id,
+        )
+
+    def _save_lock(self, doc_hash):
+        with self._save_locks_lock:
+            return self._save_locks.setdefault(doc_hash, threading.Lock())
+
+    def save(self, doc_hash, knowledge_base):
+        """
+        Writes a knowledge base to disk under the given document hash. The folder is keyed by
+        content, so a complete copy that is already saved, e.g. by another thread or process
+        indexing the same file, is kept and this one is discarded.
+
+        Args:
+            doc_hash (str): The content hash of the source document.
+            knowledge_base (FAISS): The vector store to persist.
+        """
+        import faiss
+
+        # `load` pairs the n-th chunk with the n-th vector, so keep index order here.
+        chunks = [
+            {"id": doc_id, "text": document.page_content, "metadata": document.metadata}
+            for doc_id, document in indexed_documents(knowledge_base)
+        ]
+
+        staging = tempfile.mkdtemp(dir=self.root, prefix=".tmp-")
+        try:
+            faiss.write_index(knowledge_base.index, os.path.join(staging, INDEX_FILE))
+            with open(os.path.join(staging, CHUNKS_FILE), "w", encoding="utf-8") as f:
+                json.dump(chunks, f)
+
+            folder = self.path_for(doc_hash)
+            with self._save_lock(doc_hash):
+                if self.exists(doc_hash):
+                    return
+                if os.path.isdir(folder):
+                    # An incomplete copy: move it aside first, so the folder is never half-replaced.
+                    stale = tempfile.mkdtemp(dir=self.root, prefix=".tmp-")
+                    os.replace(folder, os.path.join(stale, doc_hash))
+                    shutil.rmtree(stale, ignore_errors=True)
+                try:
+                    os.rename(staging, folder)
+                except OSError:
+                    # Another process saved the same document in the meantime.
+                    if not self.exists(doc_hash):
+                        raise
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def delete(self, doc_hash):
+        """Removes the saved knowledge base for a document, if any."""
+        shutil.rmtree(self.path_for(doc_hash), ignore_errors=True)
+
+    def _read_versions(self):
+        try:
+            with open(os.path.join(self.root, VERSIONS_FILE), encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def latest_version(self, name):
+        """
+        Returns the content hash of the most recently indexed version of a document.
+
+        Args:
+            name (str): The document name, e.g. the uploaded file name.
+
+        Returns:
+            str | None: The content hash, or None if no version of this document was indexed yet.
+        """
+        with self._versions_lock:
+            return self._read_versions().get(name)
+
+    def set_latest_version(self, name, doc_hash):
+        """
+        Records `doc_hash` as the most recently indexed version of a document.
+
+        Args:
+            name (str): The document name, e.g. the uploaded file name.
+            doc_hash (str): The content hash of that version.
+        """
+        with self._versions_lock:
+            versions = self._read_versions()
+            if versions.get(name) == doc_hash:
+                return
+            versions[name] = doc_hash
+            fd, staging = tempfile.mkstemp(dir=self.root, prefix=".tmp-")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(versions, f)
+            os.replace(staging, os.path.join(self.root, VERSIONS_FILE))
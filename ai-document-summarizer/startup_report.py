@@ -0,0 +1,108 @@
+"""
+Reports where start-up time goes when a module is imported by a fresh Python interpreter,
+e.g. by a newly started Streamlit worker.
+
+Examples:
+    python startup_report.py
+    python startup_report.py app --top 30
+    python startup_report.py utils --warm-up
+"""
+import argparse
+import subprocess
+import sys
+from collections import Counter
+
+
+def measure_imports(module, cwd=None):
+    """
+    Imports a module in a new interpreter with `-X importtime` and parses the timings it prints.
+
+    Args:
+        module (str): The module to import.
+        cwd (str | None): Directory to run the interpreter in, so local modules can be found.
+
+    Returns:
+        list[tuple[str, int, int]]: One (module name, self microseconds, cumulative microseconds)
+        entry per imported module, in the order the interpreter reported them.
+
+    Raises:
+        RuntimeError: If the module cannot be imported.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=cwd, capture_output=True, text=True
+    )
+    timings = []
+    errors = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            errors.append(line)
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if not self_us.strip().isdigit():
+            # The header line: "self [us] | cumulative | imported package".
+            continue
+        timings.append((name.strip(), int(self_us), int(cumulative_us)))
+    if result.returncode != 0:
+        raise RuntimeError(errors[-1] if errors else f"Could not import {module}")
+    return timings
+
+
+def measure_warm_up(module, cwd=None):
+    """
+    Imports a module in a new interpreter and times its `warm_up(background=False)` call.
+
+    Returns:
+        float: The warm-up time in seconds.
+    """
+    code = (
+        f"import time, {module} as m\n"
+        "started = time.perf_counter()\n"
+        "m.warm_up(background=False)\n"
+        "print(time.perf_counter() - started)\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=cwd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show where a module's import time goes.")
+    parser.add_argument("module", nargs="?", default="utils", help="Module to import (default: utils).")
+    parser.add_argument("--top", type=int, default=15, help="Number of packages and modules to list.")
+    parser.add_argument("--cwd", default=None, help="Directory to import the module from.")
+    parser.add_argument("--warm-up", action="store_true", help="Also time the module's warm_up() function.")
+    args = parser.parse_args(argv)
+
+    try:
+        timings = measure_imports(args.module, args.cwd)
+    except RuntimeError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 1
+
+    total_us = sum(self_us for _, self_us, _ in timings)
+    by_package = Counter()
+    for name, self_us, _ in timings:
+        by_package[name.split(".")[0]] += self_us
+
+    print(f"import {args.module}: {total_us / 1e6:.2f}s across {len(timings)} modules\n")
+    print(f"{'package':40} {'seconds':>8} {'share':>6}")
+    for package, self_us in by_package.most_common(args.top):
+        print(f"{package:40} {self_us / 1e6:8.3f} {self_us / max(total_us, 1):6.1%}")
+
+    print(f"\n{'slowest modules (including their imports)':40} {'seconds':>8}")
+    for name, _, cumulative_us in sorted(timings, key=lambda timing: -timing[2])[:args.top]:
+        print(f"{name:40} {cumulative_us / 1e6:8.3f}")
+
+    if args.warm_up:
+        try:
+            print(f"\nwarm_up(): {measure_warm_up(args.module, args.cwd):.2f}s")
+        except RuntimeError as e:
+            print(f"ERROR: warm_up() failed: {e}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""
+Regression checks for saving knowledge bases: chunks of incrementally updated knowledge bases must
+stay paired with their vectors, and concurrent saves of one document must not fail.
+Uses offline bag-of-words embeddings, so no API key is needed.
+
+    python -m pytest test_knowledge_base.py
+"""
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+import utils
+from knowledge_base import KnowledgeBaseRegistry
+
+
+class WordHashEmbeddings(Embeddings):
+    """Embeds a text as the normalized counts of its words, hashed into a few dimensions."""
+
+    def _embed(self, text):
+        vector = np.zeros(64, dtype="float32")
+        for word in text.lower().split():
+            vector[zlib.crc32(word.encode("utf-8")) % 64] += 1
+        return (vector / max(np.linalg.norm(vector), 1e-9)).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+def chunks(texts):
+    offset = 0
+    for text in texts:
+        yield text, {"offset": offset}
+        offset += len(text) + 2
+
+
+def test_updated_knowledge_base_survives_save_and_load(tmp_path, monkeypatch):
+    embeddings = WordHashEmbeddings()
+    monkeypatch.setattr(utils, "_embeddings", embeddings)
+
+    knowledge_base = utils.build_knowledge_base(chunks(["alpha text", "beta text", "gamma text"]))
+    knowledge_base, counts = utils.update_knowledge_base(
+        knowledge_base, chunks(["NEW intro", "alpha text", "beta text", "gamma text"])
+    )
+    assert counts == {"added": 1, "removed": 0, "kept": 3}
+
+    registry = KnowledgeBaseRegistry(str(tmp_path))
+    registry.save("v2", knowledge_base)
+    loaded = registry.load("v2", embeddings)
+
+    for query in ("alpha text", "beta text", "gamma text", "NEW intro"):
+        assert loaded.similarity_search(query, k=1)[0].page_content == query
+    assert [document.page_content for _, document in utils.ordered_documents(loaded)] == [
+        "NEW intro", "alpha text", "beta text", "gamma text"
+    ]
+
+
+def test_concurrent_saves_of_the_same_document(tmp_path, monkeypatch):
+    embeddings = WordHashEmbeddings()
+    monkeypatch.setattr(utils, "_embeddings", embeddings)
+    knowledge_base = utils.build_knowledge_base(chunks(["alpha text", "beta text", "gamma text"]))
+    registry = KnowledgeBaseRegistry(str(tmp_path))
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        for future in [executor.submit(registry.save, "v1", knowledge_base) for _ in range(32)]:
+            future.result()
+
+    assert registry.load("v1", embeddings).index.ntotal == 3
+    assert os.listdir(tmp_path) == ["v1"]
@@ -1,15 +1,332 @@
-from langchain.text_splitter import CharacterTextSplitter
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain.chains.question_answering import load_qa_chain
-from pypdf import PdfReader, errors as pypdf_errors
-from docx import Document
-from langchain_community.vectorstores import FAISS
+import logging
 import os
+import queue
+import threading
+import time
+from collections import Counter
 from api_key import GEMINI_API_KEY
+from knowledge_base import KnowledgeBaseRegistry, file_hash, ordered_documents, chunk_hash
+from map_reduce import map_reduce_summarize
+from summary_cache import SummaryCache
+from chunking import iter_token_chunks
 
 os.environ['GOOGLE_API_KEY'] = GEMINI_API_KEY
 
+EMBEDDING_MODEL = "models/embedding-001"
+LLM_MODEL = "gemini-1.5-flash"
+LLM_TEMPERATURE = 0.1
+SUMMARY_INSTRUCTION = 'summarize the content of the uploaded document in approximately 3-5 sentences'
+
+SUMMARY_MODES = {
+    "retrieval": "Quick (most relevant passages)",
+    "map_reduce": "Full document (map-reduce)",
+}
+CACHE_DIR = os.getenv(
+    "SUMMARIZER_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".summarizer_cache")
+)
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("SUMMARIZER_EMBEDDING_CACHE_MAX_ENTRIES", "100000"))
+SUMMARY_CACHE_TTL_SECONDS = float(os.getenv("SUMMARIZER_SUMMARY_CACHE_TTL", str(7 * 24 * 3600)))
+
+# Chunk sizes are measured in estimated tokens. The embedding model accepts up to 2048 tokens per text.
+CHUNK_TOKENS = 800
+CHUNK_OVERLAP_TOKENS = 80
+# Number of chunks sent per embedding request (the API accepts at most 100).
+EMBEDDING_BATCH_SIZE = 100
+# Token budget for the retrieved chunks stuffed into the retrieval-mode prompt.
+RETRIEVAL_TOKEN_BUDGET = 8000
+# Maximum number of extracted pages/blocks waiting to be chunked while the previous batch is embedded.
+PREFETCH_RECORDS = 32
+# Number of processes used to extract pages from large PDFs.
+PDF_EXTRACTION_WORKERS = int(os.getenv("SUMMARIZER_PDF_WORKERS", str(os.cpu_count() or 1)))
+# How knowledge base vectors are stored: "flat" (float32), "float16" or "pq" (product quantization).
+# Knowledge bases with at least INDEX_IVF_MIN_VECTORS chunks are also partitioned with IVF,
+# searching INDEX_IVF_NPROBE partitions per query. See index_benchmark.py to pick these.
+INDEX_TYPE = os.getenv("SUMMARIZER_INDEX_TYPE", "flat")
+INDEX_IVF_MIN_VECTORS = int(os.getenv("SUMMARIZER_IVF_MIN_VECTORS", "20000"))
+INDEX_IVF_NPROBE = int(os.getenv("SUMMARIZER_IVF_NPROBE", "16"))
+
+logger = logging.getLogger(__name__)
+
+# LangChain, the Gemini clients, FAISS, pypdf and python-docx take seconds to import, so they are
+# imported on first use (or by `warm_up`) rather than when this module is loaded.
+_embeddings = None
+_llm = None
+_knowledge_bases = None
+_summary_cache = None
+# One lock per client, so a cheap getter is not held up while another client is being imported.
+_embeddings_lock = threading.Lock()
+_llm_lock = threading.Lock()
+_knowledge_bases_lock = threading.Lock()
+_summary_cache_lock = threading.Lock()
+_warm_up_lock = threading.Lock()
+_warm_up_thread = None
+
+
+def get_embeddings():
+    """
+    Returns the Gemini embeddings client wrapped in the on-disk embedding cache.
+
+    Returns:
+        CachedEmbeddings: An embeddings client that only calls the API for chunks it has not seen before.
+    """
+    global _embeddings
+    with _embeddings_lock:
+        if _embeddings is None:
+            from langchain_google_genai import GoogleGenerativeAIEmbeddings
+            from embedding_cache import EmbeddingCache, CachedEmbeddings
+
+            cache = EmbeddingCache(
+                os.path.join(CACHE_DIR, "embeddings.sqlite3"),
+                max_entries=EMBEDDING_CACHE_MAX_ENTRIES
+            )
+            _embeddings = CachedEmbeddings(
+                GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL),
+                EMBEDDING_MODEL,
+                cache
+            )
+        return _embeddings
+
+
+def get_llm():
+    """
+    Returns the shared Gemini chat model used for summarization.
+
+    Returns:
+        ChatGoogleGenerativeAI: The chat model.
+    """
+    global _llm
+    with _llm_lock:
+        if _llm is None:
+            from langchain_google_genai import ChatGoogleGenerativeAI
+
+            _llm = ChatGoogleGenerativeAI(model=LLM_MODEL, temperature=LLM_TEMPERATURE)
+        return _llm
+
+
+def get_knowledge_base_registry():
+    """
+    Returns the registry of FAISS knowledge bases saved on disk under their document hash.
+
+    Returns:
+        KnowledgeBaseRegistry: The shared registry instance.
+    """
+    global _knowledge_bases
+    with _knowledge_bases_lock:
+        if _knowledge_bases is None:
+            _knowledge_bases = KnowledgeBaseRegistry(os.path.join(CACHE_DIR, "knowledge_bases"))
+        return _knowledge_bases
+
+
+def get_summary_cache():
+    """
+    Returns the two-tier (in-process and SQLite) cache of finished summaries.
+
+    Returns:
+        SummaryCache: The shared cache instance.
+    """
+    global _summary_cache
+    with _summary_cache_lock:
+        if _summary_cache is None:
+            _summary_cache = SummaryCache(
+                os.path.join(CACHE_DIR, "summaries.sqlite3"),
+                ttl_seconds=SUMMARY_CACHE_TTL_SECONDS
+            )
+        return _summary_cache
+
+
+def _warm_up():
+    started = time.perf_counter()
+    try:
+        import langchain.chains.question_answering  # noqa: F401
+        import langchain_community.vectorstores  # noqa: F401
+        import extraction  # noqa: F401
+        import vector_index  # noqa: F401
+
+        get_summary_cache()
+        get_knowledge_base_registry()
+        get_embeddings()
+        get_llm()
+    except Exception:
+        logger.warning("Document summarizer warm-up failed", exc_info=True)
+        return
+    logger.info("Document summarizer warmed up in %.2fs", time.perf_counter() - started)
+
+
+def warm_up(background=True):
+    """
+    Imports the heavy dependencies and constructs the embeddings client, LLM and caches ahead of
+    the first summarization, so the first request does not pay for them. Safe to call on every
+    Streamlit rerun: the work is only started once per process.
+
+    Args:
+        background (bool): Do the work on a daemon thread and return immediately.
+
+    Returns:
+        threading.Thread | None: The warm-up thread, or None when `background` is False.
+    """
+    global _warm_up_thread
+    if not background:
+        _warm_up()
+        return None
+    with _warm_up_lock:
+        if _warm_up_thread is None:
+            _warm_up_thread = threading.Thread(target=_warm_up, name="summarizer-warm-up", daemon=True)
+            _warm_up_thread.start()
+    return _warm_up_thread
+
+
+def iter_chunks(records):
+    """
+    Splits a stream of extracted text records into token-sized chunks as the records arrive,
+    so only a bounded window of the document is held in memory at any time.
+
+    Args:
+        records (Iterable[dict]): Records produced by `iter_pdf_pages` or `iter_docx_blocks`.
+
+    Yields:
+        tuple[str, dict]: The chunk text and its metadata: the character "offset" where it starts,
+        the page, paragraph or table it starts in, and its estimated "tokens".
+    """
+    return iter_token_chunks(records, chunk_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS)
+
+
+def _prefetch(iterable, maxsize):
+    """
+    Runs an iterator on a background thread and yields its items through a bounded queue,
+    so producing (e.g. parsing later pages) overlaps with consuming (e.g. embedding earlier chunks).
+    """
+    items = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+    done = object()
+
+    def produce():
+        try:
+            for item in iterable:
+                while not stop.is_set():
+                    try:
+                        items.put((item, None), timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+        except Exception as e:
+            items.put((done, e))
+            return
+        items.put((done, None))
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            item, error = items.get()
+            if error is not None:
+                raise error
+            if item is done:
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+def build_knowledge_base(chunks):
+    """
+    Embeds a stream of chunks in batches and adds them to a FAISS knowledge base as they arrive.
+    Chunks that were embedded before are served from the on-disk embedding cache.
+
+    Args:
+        chunks (Iterable[tuple[str, dict]]): Chunk texts and metadata, e.g. from `iter_chunks`.
+
+    Returns:
+        FAISS | None: The vector store, or None if the stream contained no text.
+    """
+    from langchain_community.vectorstores import FAISS
+    from vector_index import compact_knowledge_base
+
+    embeddings = get_embeddings()
+    KnowledgeBase = None
+    texts, metadatas = [], []
+
+    def flush():
+        nonlocal KnowledgeBase
+        if KnowledgeBase is None:
+            KnowledgeBase = FAISS.from_texts(texts, embeddings, metadatas=metadatas)
+        else:
+            KnowledgeBase.add_texts(texts, metadatas=metadatas)
+        texts.clear()
+        metadatas.clear()
+
+    for text, metadata in _prefetch(chunks, PREFETCH_RECORDS):
+        metadata["chunk_hash"] = chunk_hash(text)
+        texts.append(text)
+        metadatas.append(metadata)
+        if len(texts) >= EMBEDDING_BATCH_SIZE:
+            flush()
+    if texts:
+        flush()
+
+    if KnowledgeBase is not None:
+        KnowledgeBase = compact_knowledge_base(KnowledgeBase, INDEX_TYPE, INDEX_IVF_MIN_VECTORS, INDEX_IVF_NPROBE)
+    return KnowledgeBase
+
+
+def update_knowledge_base(KnowledgeBase, chunks):
+    """
+    Brings a knowledge base built from an earlier version of a document up to date with the
+    chunks of a new version, matching chunks by content hash. Only added chunks are embedded;
+    removed chunks are deleted from the index and unchanged ones are kept with updated positions.
+
+    Args:
+        KnowledgeBase (FAISS): A writable vector store of the previous version.
+        chunks (Iterable[tuple[str, dict]]): Chunk texts and metadata of the new version, e.g. from `iter_chunks`.
+
+    Returns:
+        tuple[FAISS, dict]: The updated vector store and the number of chunks "added", "removed" and "kept".
+    """
+    from vector_index import compact_knowledge_base
+
+    existing = {}
+    for doc_id, document in ordered_documents(KnowledgeBase):
+        key = document.metadata.get("chunk_hash") or chunk_hash(document.page_content)
+        existing.setdefault(key, []).append(doc_id)
+
+    seen = Counter()
+    kept = set()
+    texts, metadatas = [], []
+
+    def flush():
+        KnowledgeBase.add_texts(texts, metadatas=metadatas)
+        texts.clear()
+        metadatas.clear()
+
+    for text, metadata in _prefetch(chunks, PREFETCH_RECORDS):
+        key = chunk_hash(text)
+        metadata["chunk_hash"] = key
+        # Repeated chunks (e.g. boilerplate) are matched occurrence by occurrence.
+        occurrence = seen[key]
+        seen[key] += 1
+        matches = existing.get(key, [])
+        if occurrence < len(matches):
+            doc_id = matches[occurrence]
+            KnowledgeBase.docstore.search(doc_id).metadata = metadata
+            kept.add(doc_id)
+            continue
+        texts.append(text)
+        metadatas.append(metadata)
+        if len(texts) >= EMBEDDING_BATCH_SIZE:
+            flush()
+    if texts:
+        flush()
+
+    removed = [doc_id for doc_ids in existing.values() for doc_id in doc_ids if doc_id not in kept]
+    if removed:
+        KnowledgeBase.delete(removed)
+
+    KnowledgeBase = compact_knowledge_base(KnowledgeBase, INDEX_TYPE, INDEX_IVF_MIN_VECTORS, INDEX_IVF_NPROBE)
+    added = sum(seen.values()) - len(kept)
+    return KnowledgeBase, {"added": added, "removed": len(removed), "kept": len(kept)}
+
+
 def process_text(text):
     """
     Processes the input text by splitting it into chunks and creating a FAISS knowledge base.
@@ -20,44 +337,30 @@ def process_text(text):
     Returns:
         FAISS: A FAISS vector store containing the text chunks and their embeddings.
     """
-    text_splitter = CharacterTextSplitter(
-        separator="\n",
-        chunk_size=1000,
-        chunk_overlap=200,
-        length_function=len
-    )
-    chunks = text_splitter.split_text(text)
-
-    embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
+    return build_knowledge_base(iter_chunks([{"kind": "document", "index": 0, "offset": 0, "text": text}]))
 
-    KnowledgeBase = FAISS.from_texts(chunks, embeddings)
-    return KnowledgeBase
-
-def extract_text_from_pdf(pdf_file):
+def extract_text_from_pdf(pdf_file, max_workers=PDF_EXTRACTION_WORKERS):
     """
     Extracts text from a PDF file.
 
     Args:
         pdf_file (streamlit.runtime.uploaded_file_manager.UploadedFile): The uploaded PDF file object.
+        max_workers (int): Number of processes used to extract pages from large PDFs.
 
     Returns:
         str: The extracted text.
     """
+    from extraction import ExtractionError, iter_pdf_pages
+
     try:
-        pdf_reader = PdfReader(pdf_file)
-        text = ''
-        for page in pdf_reader.pages:
-            text += page.extract_text() or ''
-        return text
-    except pypdf_errors.PdfStreamError:
-        return "ERROR: Could not read PDF. The file might be corrupted or malformed."
-    except Exception as e:
-        return f"ERROR: An unexpected error occurred while processing the PDF: {e}"
+        return ''.join(record["text"] for record in iter_pdf_pages(pdf_file, max_workers=max_workers))
+    except ExtractionError as e:
+        return f"ERROR: {e}"
 
 
 def extract_text_from_docx(docx_file):
     """
-    Extracts text from a DOCX (Word) file.
+    Extracts text from a DOCX (Word) file, including tables.
 
     Args:
         docx_file (streamlit.runtime.uploaded_file_manager.UploadedFile): The uploaded DOCX file object.
@@ -65,22 +368,167 @@ def extract_text_from_docx(docx_file):
     Returns:
         str: The extracted text.
     """
+    from extraction import ExtractionError, iter_docx_blocks
+
+    try:
+        return ''.join(record["text"] for record in iter_docx_blocks(docx_file))
+    except ExtractionError as e:
+        return f"ERROR: {e}"
+
+
+def summary_cache_key(doc_hash, mode="retrieval"):
+    """
+    Builds the summary cache key for a document summarized with the current query, model and temperature.
+
+    Args:
+        doc_hash (str): The content hash of the document.
+        mode (str): One of the keys of `SUMMARY_MODES`.
+
+    Returns:
+        str: The cache key.
+    """
+    return SummaryCache.make_key(doc_hash, SUMMARY_INSTRUCTION, LLM_MODEL, LLM_TEMPERATURE, mode)
+
+
+def load_knowledge_base(doc_file, doc_hash=None, pdf_workers=PDF_EXTRACTION_WORKERS):
+    """
+    Returns the FAISS knowledge base of a document: from disk if this exact file was indexed before,
+    incrementally from the previous version if a file with the same name was indexed before,
+    or built from scratch otherwise.
+
+    Args:
+        doc_file: A binary file-like object with a `name` attribute (PDF or DOCX).
+        doc_hash (str | None): The content hash of the file, if already computed.
+        pdf_workers (int): Number of processes used to extract pages from large PDFs.
+
+    Returns:
+        tuple[FAISS | None, str | None]: The knowledge base, or None and a message explaining why
+        no knowledge base could be built.
+    """
+    file_extension = os.path.splitext(doc_file.name)[1].lower()
+
+    if file_extension not in ('.pdf', '.docx'):
+        return None, "Unsupported file type. Please upload a PDF or DOCX document."
+
+    from extraction import ExtractionError, iter_pdf_pages, iter_docx_blocks
+    from vector_index import is_partitioned
+
+    if doc_hash is None:
+        doc_hash = file_hash(doc_file)
+
+    registry = get_knowledge_base_registry()
+    embeddings = get_embeddings()
+    KnowledgeBase = registry.load(doc_hash, embeddings)
+
+    if KnowledgeBase is None:
+        if file_extension == '.pdf':
+            records = iter_pdf_pages(doc_file, max_workers=pdf_workers)
+        else:
+            records = iter_docx_blocks(doc_file)
+
+        previous_hash = registry.latest_version(doc_file.name)
+        previous = registry.load(previous_hash, embeddings, writable=True) if previous_hash else None
+        if previous is not None and is_partitioned(previous.index):
+            # Removing chunks from an IVF index does not renumber the rest, so it is rebuilt instead;
+            # unchanged chunks still come from the embedding cache.
+            previous = None
+
+        try:
+            if previous is not None:
+                KnowledgeBase, _ = update_knowledge_base(previous, iter_chunks(records))
+            else:
+                KnowledgeBase = build_knowledge_base(iter_chunks(records))
+        except ExtractionError as e:
+            return None, f"ERROR: {e}"
+        except Exception as e:
+            return None, f"ERROR: Failed to create knowledge base from document. Ensure the API key in `api_key.py` is correct. Details: {e}"
+
+        if KnowledgeBase is None or KnowledgeBase.index.ntotal == 0:
+            return None, "Could not extract any meaningful text from the provided document. It might be an image-based file, empty, or encrypted."
+
+        try:
+            registry.save(doc_hash, KnowledgeBase)
+        except Exception:
+            # The knowledge base is still usable; it is only rebuilt the next time this file comes up.
+            logger.warning("Could not save the knowledge base of %s", doc_file.name, exc_info=True)
+
+    registry.set_latest_version(doc_file.name, doc_hash)
+    return KnowledgeBase, None
+
+
+def summarize_knowledge_base(KnowledgeBase, mode="retrieval", max_workers=4):
+    """
+    Generates a summary from a document's knowledge base with the Gemini LLM.
+
+    Args:
+        KnowledgeBase (FAISS): The document's vector store.
+        mode (str): One of the keys of `SUMMARY_MODES`.
+        max_workers (int): Maximum number of concurrent LLM calls in "map_reduce" mode.
+
+    Returns:
+        str: The summary.
+    """
+    query = SUMMARY_INSTRUCTION
+
+    if mode == "map_reduce":
+        chunks = [document.page_content for _, document in ordered_documents(KnowledgeBase)]
+        return map_reduce_summarize(chunks, get_llm(), query, max_workers=max_workers)
+
+    return _answer(KnowledgeBase, query)
+
+
+def _answer(KnowledgeBase, query):
+    """
+    Runs `query` against the chunks most similar to it with a single LLM call.
+    """
+    from langchain.chains.question_answering import load_qa_chain
+
+    docs = KnowledgeBase.similarity_search(query, k=max(1, RETRIEVAL_TOKEN_BUDGET // CHUNK_TOKENS))
+    chain = load_qa_chain(get_llm(), chain_type='stuff')
+    return chain.run(input_documents=docs, question=query)
+
+
+def answer_question(KnowledgeBase, question):
+    """
+    Answers a question about a document. Only the chunks most relevant to the question are sent to
+    the Gemini LLM, so with a knowledge base that is already loaded each question costs one
+    similarity search and one LLM call.
+
+    Args:
+        KnowledgeBase (FAISS): The document's vector store, e.g. from `load_knowledge_base`.
+        question (str): The user's question.
+
+    Returns:
+        str: The answer, or an error message.
+    """
+    if not question or not question.strip():
+        return "Please enter a question about the document."
+
     try:
-        document = Document(docx_file)
-        text = ''
-        for paragraph in document.paragraphs:
-            text += paragraph.text + '\n'
-        return text
+        return _answer(KnowledgeBase, question.strip())
     except Exception as e:
-        return f"ERROR: An error occurred while processing the Word document: {e}"
+        return f"ERROR: An error occurred while answering the question with the LLM: {e}"
 
 
-def summerizer(doc_file):
+def summerizer(doc_file, mode="retrieval", max_workers=4, refresh=False):
     """
     Summarizes the content of an uploaded PDF or Word document using the Gemini API.
 
+    When a new version of a previously indexed document (same file name, different content) is
+    uploaded, its knowledge base is derived from the previous version's by embedding only the changed chunks.
+
+    In "retrieval" mode only the chunks most similar to the summarization query are sent to the LLM.
+    In "map_reduce" mode every chunk is covered: groups of chunks are summarized concurrently and the
+    partial summaries are merged hierarchically.
+
+    Finished summaries are cached by document hash, query, mode, model and temperature,
+    so re-uploading the same document returns immediately.
+
     Args:
         doc_file (streamlit.runtime.uploaded_file_manager.UploadedFile): The uploaded document file object (PDF or DOCX).
+        mode (str): One of the keys of `SUMMARY_MODES`.
+        max_workers (int): Maximum number of concurrent LLM calls in "map_reduce" mode.
+        refresh (bool): Discard any cached summaries of this document and generate a new one.
 
     Returns:
         str: The summarized text of the document, or an error message.
@@ -89,36 +537,29 @@ def summerizer(doc_file):
         return "No document file uploaded."
 
     file_extension = os.path.splitext(doc_file.name)[1].lower()
-    text = ''
 
-    if file_extension == '.pdf':
-        text = extract_text_from_pdf(doc_file)
-    elif file_extension == '.docx':
-        text = extract_text_from_docx(doc_file)
-    else:
+    if file_extension not in ('.pdf', '.docx'):
         return "Unsupported file type. Please upload a PDF or DOCX document."
 
-    if text.startswith("ERROR:"):
-        return text
-
-    if not text.strip():
-        return "Could not extract any meaningful text from the provided document. It might be an image-based file, empty, or encrypted."
-
-    KnowledgeBase = process_text(text)
-    query = 'summarize the content of the uploaded document in approximately 3-5 sentences'
+    doc_hash = file_hash(doc_file)
 
-    if query:
-        docs = KnowledgeBase.similarity_search(query)
-
-        llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash", temperature=0.1)
+    summaries = get_summary_cache()
+    cache_key = summary_cache_key(doc_hash, mode)
+    if refresh:
+        summaries.invalidate(doc_hash)
+    else:
+        cached_summary = summaries.get(cache_key)
+        if cached_summary is not None:
+            return cached_summary
 
-        chain = load_qa_chain(llm, chain_type='stuff')
+    KnowledgeBase, error = load_knowledge_base(doc_file, doc_hash)
+    if error:
+        return error
 
-        try:
-            response = chain.run(input_documents=docs, question=query)
-            return response
-        except Exception as e:
-            return f"ERROR: An error occurred during summarization with the LLM: {e}"
-    else:
-        return "Summarization query is empty."
+    try:
+        response = summarize_knowledge_base(KnowledgeBase, mode, max_workers)
+    except Exception as e:
+        return f"ERROR: An error occurred during summarization with the LLM: {e}"
 
+    summaries.put(cache_key, doc_hash, response)
+    return response
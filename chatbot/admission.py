@@ -0,0 +1,108 @@
+import asyncio
+import math
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+
+class Rejected(Exception):
+    """Raised when a request is turned away; the client may retry after `retry_after` seconds."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class ConcurrencyLimiter:
+    """
+    Lets at most `max_concurrent` calls run at once. Up to `max_queue` more wait for a turn, for at
+    most `queue_timeout` seconds; beyond that calls are rejected straight away, so a burst of
+    traffic turns into quick retries instead of a pile of slow, doomed requests upstream.
+    """
+
+    def __init__(self, max_concurrent: int = 16, max_queue: int = 64, queue_timeout: float = 10):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        # Moving average of how long a call holds its slot, used to suggest when to retry.
+        self._average_hold = 1.0
+
+    def retry_after(self) -> int:
+        """Estimates in how many seconds a slot is likely to be free."""
+        queued_rounds = (self.waiting + 1) / self.max_concurrent
+        return max(1, math.ceil(self._average_hold * queued_rounds))
+
+    def is_full(self) -> bool:
+        """Tells whether a new call would be rejected right now."""
+        return self._semaphore.locked() and self.waiting >= self.max_queue
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Holds one of the concurrent slots for the duration of the `async with` block.
+
+        Raises:
+            Rejected: If the queue is full or no slot freed up within `queue_timeout`.
+        """
+        if not self._semaphore.locked():
+            # A slot is free, so this does not wait.
+            await self._semaphore.acquire()
+        elif self.waiting >= self.max_queue:
+            raise Rejected("busy", self.retry_after())
+        else:
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise Rejected("busy", self.retry_after())
+            finally:
+                self.waiting -= 1
+
+        self.active += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+            self._average_hold = 0.9 * self._average_hold + 0.1 * (time.monotonic() - started)
+
+
+class RateLimiter:
+    """
+    A token bucket per client: each client may make `burst` requests at once, refilled at
+    `rate_per_minute`. Buckets of the least recently seen clients beyond `max_clients` are dropped.
+    A `rate_per_minute` of 0 disables the limit.
+    """
+
+    def __init__(self, rate_per_minute: float = 30, burst: int = 10, max_clients: int = 10000):
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, client: str):
+        """
+        Takes a token from the client's bucket.
+
+        Raises:
+            Rejected: If the bucket is empty; `retry_after` is when the next token arrives.
+        """
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens < 1:
+                self._buckets[client] = (tokens, now)
+                raise Rejected("rate_limited", max(1, math.ceil((1 - tokens) / self.rate)))
+            self._buckets[client] = (tokens - 1, now)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
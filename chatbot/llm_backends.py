@@ -0,0 +1,197 @@
+import asyncio
+import hashlib
+import json
+import random
+import time
+from typing import AsyncIterator, Optional
+
+LLM_BACKENDS = ("gemini", "ollama", "stub")
+
+SAFETY_SETTINGS = [
+    {
+        "category": "HARM_CATEGORY_HARASSMENT",
+        "threshold": "BLOCK_ONLY_HIGH"
+    },
+    {
+        "category": "HARM_CATEGORY_HATE_SPEECH",
+        "threshold": "BLOCK_ONLY_HIGH"
+    },
+    {
+        "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
+        "threshold": "BLOCK_ONLY_HIGH"
+    },
+    {
+        "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
+        "threshold": "BLOCK_ONLY_HIGH"
+    }
+]
+
+
+class GeminiBackend:
+    """
+    Google's Gemini API.
+
+    Every backend takes the conversation so far in Gemini's history format, a list of
+    `{"role": "user" | "model", "parts": [text]}` entries, and a `generation_config` with
+    "max_output_tokens" and "temperature".
+    """
+
+    name = "gemini"
+
+    def __init__(self, api_key: str, model_name: str = "gemini-1.5-flash"):
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        self.model_name = model_name
+        self._model = genai.GenerativeModel(model_name)
+
+    async def complete(self, history: list, message: str, generation_config: dict) -> str:
+        """Returns the model's whole reply to a message."""
+        chat_session = self._model.start_chat(history=history)
+        response = await chat_session.send_message_async(
+            message,
+            safety_settings=SAFETY_SETTINGS,
+            generation_config=generation_config
+        )
+        return response.text
+
+    async def stream(self, history: list, message: str, generation_config: dict) -> AsyncIterator[str]:
+        """Yields the model's reply to a message piece by piece."""
+        chat_session = self._model.start_chat(history=history)
+        response = await chat_session.send_message_async(
+            message,
+            stream=True,
+            safety_settings=SAFETY_SETTINGS,
+            generation_config=generation_config
+        )
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+    async def close(self):
+        pass
+
+
+class OllamaBackend:
+    """A model served by a local or self-hosted Ollama server, through its `/api/chat` endpoint."""
+
+    name = "ollama"
+
+    def __init__(self, base_url: str = "http://localhost:11434", model_name: str = "llama3.2"):
+        import httpx
+        self.model_name = model_name
+        # No read timeout: the caller decides how long to wait for a reply.
+        self._client = httpx.AsyncClient(base_url=base_url, timeout=httpx.Timeout(10, read=None))
+
+    def _request(self, history: list, message: str, generation_config: dict, stream: bool) -> dict:
+        messages = [
+            {"role": "assistant" if entry["role"] == "model" else "user", "content": "\n".join(entry["parts"])}
+            for entry in history
+        ]
+        messages.append({"role": "user", "content": message})
+        return {
+            "model": self.model_name,
+            "messages": messages,
+            "stream": stream,
+            "options": {
+                "num_predict": generation_config["max_output_tokens"],
+                "temperature": generation_config["temperature"],
+            },
+        }
+
+    async def complete(self, history: list, message: str, generation_config: dict) -> str:
+        """Returns the model's whole reply to a message."""
+        response = await self._client.post("/api/chat", json=self._request(history, message, generation_config, False))
+        if response.is_error:
+            raise RuntimeError(f"Ollama returned {response.status_code}: {response.text}")
+        return response.json()["message"]["content"]
+
+    async def stream(self, history: list, message: str, generation_config: dict) -> AsyncIterator[str]:
+        """Yields the model's reply to a message piece by piece."""
+        request = self._request(history, message, generation_config, True)
+        async with self._client.stream("POST", "/api/chat", json=request) as response:
+            if response.is_error:
+                await response.aread()
+                raise RuntimeError(f"Ollama returned {response.status_code}: {response.text}")
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if "error" in chunk:
+                    raise RuntimeError(f"Ollama error: {chunk['error']}")
+                text = chunk.get("message", {}).get("content")
+                if text:
+                    yield text
+
+    async def close(self):
+        await self._client.aclose()
+
+
+class StubBackend:
+    """
+    A stand-in model that needs no network or API key, for load tests and offline development.
+
+    It answers after `latency` seconds with `reply_tokens` words at `tokens_per_second`
+    (0 means as fast as possible). The words depend only on the message and the length of the
+    history, so the same conversation always gets the same replies.
+    """
+
+    name = "stub"
+    model_name = "stub"
+    WORDS = (
+        "the", "service", "answers", "quickly", "with", "a", "steady", "stream", "of", "words",
+        "while", "sessions", "history", "and", "uploads", "are", "measured", "under", "load", "today",
+    )
+
+    def __init__(self, latency: float = 0.5, tokens_per_second: float = 50, reply_tokens: int = 60):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.reply_tokens = reply_tokens
+
+    def _words(self, history: list, message: str, max_tokens: Optional[int]) -> list:
+        seed = hashlib.sha256(f"{len(history)}:{message}".encode("utf-8")).digest()
+        rng = random.Random(seed)
+        count = min(self.reply_tokens, max_tokens) if max_tokens else self.reply_tokens
+        return [rng.choice(self.WORDS) for _ in range(count)]
+
+    async def complete(self, history: list, message: str, generation_config: dict) -> str:
+        """Returns the model's whole reply to a message."""
+        words = self._words(history, message, generation_config.get("max_output_tokens"))
+        delay = self.latency
+        if self.tokens_per_second > 0:
+            delay += len(words) / self.tokens_per_second
+        await asyncio.sleep(delay)
+        return " ".join(words)
+
+    async def stream(self, history: list, message: str, generation_config: dict) -> AsyncIterator[str]:
+        """Yields the model's reply to a message word by word, at `tokens_per_second`."""
+        words = self._words(history, message, generation_config.get("max_output_tokens"))
+        await asyncio.sleep(self.latency)
+        started = time.monotonic()
+        for position, word in enumerate(words):
+            if self.tokens_per_second > 0:
+                # Sleeping until each word's due time keeps the rate steady however long a step takes.
+                await asyncio.sleep(max(0, started + position / self.tokens_per_second - time.monotonic()))
+            yield word if position == 0 else " " + word
+
+    async def close(self):
+        pass
+
+
+def create_backend(kind: str = "gemini", **options):
+    """
+    Creates the model backend selected by configuration.
+
+    Args:
+        kind (str): One of `LLM_BACKENDS`.
+        **options: Arguments of that backend's class.
+
+    Raises:
+        ValueError: If `kind` is not one of `LLM_BACKENDS`.
+    """
+    if kind == "gemini":
+        return GeminiBackend(**options)
+    if kind == "ollama":
+        return OllamaBackend(**options)
+    if kind == "stub":
+        return StubBackend(**options)
+    raise ValueError(f"Unknown LLM backend {kind!r}, expected one of {', '.join(LLM_BACKENDS)}")
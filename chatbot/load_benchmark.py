@@ -0,0 +1,318 @@
+"""
+Load-tests the chatbot API: starts the server against the stub model (see `llm_backends`), drives
+`/api/health`, `/api/chat` and `/api/upload` at a fixed concurrency, and reports throughput,
+latency percentiles and the server's memory per conversation. Results are saved as JSON so
+runs on different commits can be compared.
+
+Linux only for the memory figures, which are read from /proc. The load is generated on the same
+machine, so leave it spare cores or the client's own CPU use shows up as server latency.
+
+Examples:
+    python load_benchmark.py                                    # defaults, stub answering in 0.2 s
+    python load_benchmark.py --concurrency 64 --requests 2000 --stub-latency 0 --stub-rate 0
+    python load_benchmark.py --workers 4 --env SESSION_STORE=sqlite --baseline benchmark_results/old.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+SCENARIOS = ("health", "chat", "upload")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def process_tree(pid: int) -> list:
+    """Returns the pid and the pids of all its descendants, e.g. uvicorn's worker processes."""
+    parents = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as stat_file:
+                # The command name in parentheses may contain spaces, so split after it.
+                fields = stat_file.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        parents.setdefault(int(fields[1]), []).append(int(entry))
+    pids = [pid]
+    for current in pids:
+        pids.extend(parents.get(current, []))
+    return pids
+
+
+def rss_bytes(pid: int, field: str = "VmRSS"):
+    """
+    Sums a memory field of /proc/<pid>/status ("VmRSS" for resident memory, "VmHWM" for its peak)
+    over a process and its descendants. Returns None where /proc is not available.
+    """
+    total = 0
+    try:
+        pids = process_tree(pid)
+    except OSError:
+        return None
+    for member in pids:
+        try:
+            with open(f"/proc/{member}/status") as status_file:
+                for line in status_file:
+                    if line.startswith(field + ":"):
+                        total += int(line.split()[1]) * 1024
+        except OSError:
+            continue
+    return total
+
+
+def summarize(latencies: list, statuses: list, elapsed: float) -> dict:
+    """
+    Turns the latencies (seconds) and status codes of one scenario into its report row.
+
+    Returns:
+        dict: "requests", "ok" (2xx), "rejected" (429), "errors" (anything else), "throughput"
+        in successful requests per second, and "mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms".
+    """
+    ok = sum(1 for status in statuses if 200 <= status < 300)
+    rejected = sum(1 for status in statuses if status == 429)
+    row = {
+        "requests": len(statuses),
+        "ok": ok,
+        "rejected": rejected,
+        "errors": len(statuses) - ok - rejected,
+        "seconds": elapsed,
+        "throughput": ok / elapsed if elapsed > 0 else 0.0,
+    }
+    if len(latencies) >= 2:
+        cuts = statistics.quantiles([latency * 1000 for latency in latencies], n=100, method="inclusive")
+        row.update({
+            "mean_ms": statistics.fmean(latencies) * 1000,
+            "p50_ms": cuts[49],
+            "p95_ms": cuts[94],
+            "p99_ms": cuts[98],
+            "max_ms": max(latencies) * 1000,
+        })
+    return row
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario: str, requests: int, concurrency: int,
+                       sessions: int, upload_bytes: int) -> dict:
+    """
+    Sends `requests` requests of one scenario from `concurrency` concurrent clients.
+
+    Chat messages are spread over `sessions` conversations, each created by its first message,
+    so the history grows as it would with real users. Every upload has distinct content, so
+    none is answered from the deduplication cache.
+    """
+    latencies, statuses = [], []
+    session_ids = [None] * sessions
+    counter = iter(range(requests))
+
+    async def send(number: int) -> httpx.Response:
+        if scenario == "health":
+            return await client.get("/api/health")
+        if scenario == "chat":
+            slot = number % sessions
+            data = {"prompt": f"Message {number} about topic {number % 7}. What do you think?"}
+            if session_ids[slot] is not None:
+                data["session_id"] = session_ids[slot]
+            response = await client.post("/api/chat", data=data)
+            if response.status_code == 200 and session_ids[slot] is None:
+                session_ids[slot] = response.json()["session_id"]
+            return response
+        line = f"upload {number} {time.time_ns()}\n".encode()
+        content = (line * (upload_bytes // len(line) + 1))[:upload_bytes]
+        return await client.post("/api/upload", files={"file": (f"bench_{number}.txt", content, "text/plain")})
+
+    async def client_loop():
+        for number in counter:
+            started = time.perf_counter()
+            try:
+                response = await send(number)
+                status = response.status_code
+            except httpx.HTTPError:
+                status = 0
+            latencies.append(time.perf_counter() - started)
+            statuses.append(status)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    row = summarize(latencies, statuses, time.perf_counter() - started)
+    if scenario == "chat":
+        row["sessions"] = sum(1 for session_id in session_ids if session_id is not None)
+    return row
+
+
+async def wait_until_healthy(client: httpx.AsyncClient, server: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"The server exited with code {server.returncode}")
+        try:
+            if (await client.get("/api/health")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"The server did not become healthy within {timeout:.0f} seconds")
+
+
+async def benchmark(args, base_url: str, server: subprocess.Popen) -> dict:
+    """Runs the selected scenarios in order and measures the server's memory around the chat scenario."""
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+        await wait_until_healthy(client, server)
+        await run_scenario(client, "health", min(100, args.requests), args.concurrency, 1, 0)
+
+        results, memory = {}, {}
+        for scenario in args.scenarios:
+            rss_before = rss_bytes(server.pid)
+            results[scenario] = await run_scenario(
+                client, scenario, args.requests, args.concurrency, args.sessions, args.upload_kb * 1024
+            )
+            rss_after = rss_bytes(server.pid)
+            if scenario == "chat" and rss_before is not None and results[scenario]["sessions"]:
+                memory = {
+                    "rss_before_mb": rss_before / 2**20,
+                    "rss_after_mb": rss_after / 2**20,
+                    "sessions": results[scenario]["sessions"],
+                    "per_session_kb": (rss_after - rss_before) / 1024 / results[scenario]["sessions"],
+                }
+        peak = rss_bytes(server.pid, "VmHWM")
+        if peak is not None:
+            memory["peak_rss_mb"] = peak / 2**20
+        return {"results": results, "memory": memory}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report: dict, baseline=None):
+    print(f"{'scenario':8} {'requests':>8} {'ok':>6} {'429':>5} {'errors':>6} {'req/s':>8} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for scenario, row in report["results"].items():
+        print(
+            f"{scenario:8} {row['requests']:8} {row['ok']:6} {row['rejected']:5} {row['errors']:6} "
+            f"{row['throughput']:8.1f} {row.get('p50_ms', 0):8.1f} {row.get('p95_ms', 0):8.1f} {row.get('p99_ms', 0):8.1f}"
+        )
+    memory = report["memory"]
+    if "per_session_kb" in memory:
+        print(f"\nServer memory: {memory['rss_before_mb']:.1f} MB before chat, {memory['rss_after_mb']:.1f} MB after "
+              f"{memory['sessions']} sessions ({memory['per_session_kb']:.1f} KB per session), "
+              f"peak {memory['peak_rss_mb']:.1f} MB")
+
+    if baseline is None:
+        return
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'} ({baseline.get('timestamp', '?')}):")
+    for scenario, row in report["results"].items():
+        old = baseline.get("results", {}).get(scenario)
+        if not old or not old.get("throughput") or not old.get("p95_ms") or "p95_ms" not in row:
+            continue
+        print(f"{scenario:8} req/s {row['throughput'] / old['throughput'] - 1:+7.1%}   "
+              f"p95 {row['p95_ms'] / old['p95_ms'] - 1:+7.1%}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the chatbot API against a stub model.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"Comma-separated scenarios to run, in order (default: {','.join(SCENARIOS)}).")
+    parser.add_argument("--requests", type=int, default=500, help="Requests sent per scenario.")
+    parser.add_argument("--concurrency", type=int, default=16, help="Requests in flight at once.")
+    parser.add_argument("--sessions", type=int, default=200, help="Conversations the chat messages are spread over.")
+    parser.add_argument("--upload-kb", type=int, default=64, help="Size of each uploaded file in KB.")
+    parser.add_argument("--workers", type=int, default=1, help="Server worker processes.")
+    parser.add_argument("--stub-latency", type=float, default=0.2, help="Seconds the stub model waits before answering.")
+    parser.add_argument("--stub-rate", type=float, default=0, help="Words per second of the stub model (0 for no delay).")
+    parser.add_argument("--stub-tokens", type=int, default=60, help="Words in each stub reply.")
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE",
+                        help="Extra server setting, e.g. --env MAX_CONCURRENT_LLM_CALLS=64. May be repeated.")
+    parser.add_argument("--timeout", type=float, default=120, help="Seconds before a request counts as failed.")
+    parser.add_argument("--output", help="JSON file for the results (default: benchmark_results/<time>_<commit>.json).")
+    parser.add_argument("--baseline", help="Earlier results file to compare throughput and p95 latency with.")
+    args = parser.parse_args(argv)
+    args.scenarios = list(dict.fromkeys(scenario.strip() for scenario in args.scenarios.split(",") if scenario.strip()))
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        print(f"ERROR: Unknown scenarios {', '.join(sorted(unknown))}, expected {', '.join(SCENARIOS)}", file=sys.stderr)
+        return 1
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+
+    chatbot_dir = os.path.dirname(os.path.abspath(__file__))
+    port = free_port()
+    with tempfile.TemporaryDirectory(prefix="chatbot-bench-") as work_dir:
+        env = dict(
+            os.environ,
+            LLM_BACKEND="stub",
+            STUB_LATENCY=str(args.stub_latency),
+            STUB_TOKENS_PER_SECOND=str(args.stub_rate),
+            STUB_REPLY_TOKENS=str(args.stub_tokens),
+            # Every request comes from this machine, so the per-client limit would cap the whole run.
+            RATE_LIMIT_PER_MINUTE="0",
+            UPLOAD_DIR=os.path.join(work_dir, "uploads"),
+            SESSION_DB=os.path.join(work_dir, "sessions.db"),
+            LOG_FILE=os.path.join(work_dir, "chatbot.log"),
+        )
+        env.update(setting.split("=", 1) for setting in args.env)
+        command = [
+            sys.executable, "-m", "uvicorn", "main:app",
+            "--host", "127.0.0.1", "--port", str(port), "--workers", str(args.workers), "--no-access-log",
+        ]
+        with open(os.path.join(work_dir, "server.out"), "wb") as server_output:
+            server = subprocess.Popen(command, cwd=chatbot_dir, env=env, stdout=server_output, stderr=subprocess.STDOUT)
+            try:
+                measured = asyncio.run(benchmark(args, f"http://127.0.0.1:{port}", server))
+            except RuntimeError as e:
+                print(f"ERROR: {str(e)}", file=sys.stderr)
+                server_output.flush()
+                with open(server_output.name, encoding="utf-8", errors="replace") as log_file:
+                    print(log_file.read()[-2000:], file=sys.stderr)
+                return 1
+            finally:
+                server.terminate()
+                try:
+                    server.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    server.kill()
+
+    timestamp = datetime.now(timezone.utc)
+    commit = git_commit()
+    report = {
+        "timestamp": timestamp.isoformat(),
+        "commit": commit,
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        **measured,
+    }
+    output = args.output or os.path.join(
+        "benchmark_results", f"{timestamp:%Y%m%dT%H%M%S}_{commit or 'unknown'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as output_file:
+        json.dump(report, output_file, indent=2)
+
+    print_report(report, baseline)
+    print(f"\nResults saved to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+from datetime import datetime, timezone
+
+# Attributes every LogRecord has; anything else on a record was passed through `extra=`.
+STANDARD_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line, including any `extra=` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in STANDARD_RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class RecordQueueHandler(logging.handlers.QueueHandler):
+    """
+    Puts records on the queue with their message and traceback already rendered, but without
+    applying a formatter, so each handler behind the listener can still format them its own way.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+
+def setup_logging(log_file: str = "chatbot.log", max_bytes: int = 10 * 1024 * 1024, backup_count: int = 5,
+                  level: str = "INFO") -> logging.handlers.QueueListener:
+    """
+    Sends all logging through an in-memory queue to a background thread, which writes JSON lines
+    to a size-rotated `log_file` and readable lines to the console. Logging calls on the event
+    loop then only enqueue the record and never wait for the disk.
+
+    Args:
+        log_file (str): Path of the JSON log file.
+        max_bytes (int): Size at which the log file is rotated. With 0 it is never rotated here, but
+            reopened when moved, so several processes can share it and an external tool can rotate it.
+        backup_count (int): Rotated files to keep.
+        level (str): Minimum level to log.
+
+    Returns:
+        logging.handlers.QueueListener: The running listener; stop it to flush the queue.
+    """
+    if max_bytes > 0:
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+        )
+    else:
+        file_handler = logging.handlers.WatchedFileHandler(log_file, encoding="utf-8")
+    file_handler.setFormatter(JsonFormatter())
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(RecordQueueHandler(log_queue))
+    return listener
+
+
+def truncate(text: str, limit: int) -> str:
+    """Shortens text for logging to at most `limit` characters; a `limit` of 0 hides it entirely."""
+    if limit <= 0:
+        return f"<{len(text)} chars>"
+    return text if len(text) <= limit else text[:limit] + "..."
@@ -1,50 +1,153 @@
-from fastapi import FastAPI, Request, Form, HTTPException, UploadFile, File
+from fastapi import FastAPI, Request, Form, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, JSONResponse, FileResponse
+from fastapi.responses import HTMLResponse, JSONResponse, FileResponse, StreamingResponse, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
-import google.generativeai as genai
+import asyncio
+import json
+import multiprocessing
 import os
+import time
+import uuid
 from dotenv import load_dotenv
 from datetime import datetime
 import logging
 from typing import Optional
 from pathlib import Path
+import metrics
+from admission import ConcurrencyLimiter, RateLimiter, Rejected
+from llm_backends import create_backend
+from logging_setup import setup_logging, truncate
+from retrieval import INDEXABLE_TYPES, DocumentLibrary
+from session_store import create_session_store
+from sessions import SessionManager
+from uploads import MULTIPART_OVERHEAD, UploadError, UploadStore, receive_upload
 
 load_dotenv()
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("chatbot.log"),
-        logging.StreamHandler()
-    ]
+# Characters of each prompt written to the log; 0 logs only its length.
+LOG_PROMPT_CHARS = int(os.getenv("LOG_PROMPT_CHARS", "100"))
+LOG_FILE = os.getenv("LOG_FILE", "chatbot.log")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+if "{pid}" in LOG_FILE:
+    LOG_FILE = LOG_FILE.replace("{pid}", str(os.getpid()))
+elif multiprocessing.parent_process() is not None:
+    # A worker of `uvicorn --workers N` (or --reload) shares the file with other processes,
+    # and rotating it from several of them at once would race.
+    LOG_MAX_BYTES = 0
+setup_logging(
+    LOG_FILE,
+    max_bytes=LOG_MAX_BYTES,
+    backup_count=int(os.getenv("LOG_BACKUP_COUNT", "5")),
+    level=os.getenv("LOG_LEVEL", "INFO")
 )
 logger = logging.getLogger(__name__)
 
-try:
-    from api_key import GEMINI_API_KEY
-    api_key = GEMINI_API_KEY
-    logger.info("API key loaded from api_key.py")
-except ImportError:
-    api_key = os.getenv("GEMINI_API_KEY")
-    logger.info("API key loaded from environment variables")
+# Which model answers: "gemini", "ollama" (a local Ollama server) or "stub" (canned replies, for load tests).
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+if LLM_BACKEND == "gemini":
+    try:
+        from api_key import GEMINI_API_KEY
+        api_key = GEMINI_API_KEY
+        logger.info("API key loaded from api_key.py")
+    except ImportError:
+        api_key = os.getenv("GEMINI_API_KEY")
+        logger.info("API key loaded from environment variables")
 
-if not api_key:
-    logger.error("No API key found. Please set GEMINI_API_KEY in .env file or api_key.py")
-    raise RuntimeError("No API key found")
+    if not api_key:
+        logger.error("No API key found. Please set GEMINI_API_KEY in .env file or api_key.py")
+        raise RuntimeError("No API key found")
+    backend_options = {"api_key": api_key, "model_name": os.getenv("GEMINI_MODEL", "gemini-1.5-flash")}
+elif LLM_BACKEND == "ollama":
+    backend_options = {
+        "base_url": os.getenv("OLLAMA_URL", "http://localhost:11434"),
+        "model_name": os.getenv("OLLAMA_MODEL", "llama3.2")
+    }
+elif LLM_BACKEND == "stub":
+    # Seconds before the first word, words per second (0 for no delay) and words per reply.
+    backend_options = {
+        "latency": float(os.getenv("STUB_LATENCY", "0.5")),
+        "tokens_per_second": float(os.getenv("STUB_TOKENS_PER_SECOND", "50")),
+        "reply_tokens": int(os.getenv("STUB_REPLY_TOKENS", "60"))
+    }
+else:
+    backend_options = {}
 
 try:
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel("gemini-1.5-flash")
-    logger.info("Gemini AI model initialized successfully")
+    llm = create_backend(LLM_BACKEND, **backend_options)
+    logger.info(f"{LLM_BACKEND} backend initialized with model {llm.model_name}")
 except Exception as e:
-    logger.error(f"Failed to initialize Gemini AI: {str(e)}")
+    logger.error(f"Failed to initialize the {LLM_BACKEND} backend: {str(e)}")
     raise RuntimeError("Failed to initialize AI service")
 
-UPLOAD_DIR = "uploads"
-Path(UPLOAD_DIR).mkdir(exist_ok=True)
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+Path(UPLOAD_DIR).mkdir(parents=True, exist_ok=True)
+MAX_UPLOAD_SIZE = 5 * 1024 * 1024
+ALLOWED_UPLOAD_TYPES = [
+    "text/plain", "application/pdf", 
+    "image/jpeg", "image/png",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+]
+upload_store = UploadStore(UPLOAD_DIR, MAX_UPLOAD_SIZE)
+# Processes extracting text from uploaded files, and file excerpts added to each message.
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "4"))
+documents = DocumentLibrary(upload_store, workers=INGEST_WORKERS, top_k=RETRIEVAL_TOP_K)
+
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "1000"))
+SESSION_IDLE_TIMEOUT = float(os.getenv("SESSION_IDLE_TIMEOUT", "1800"))
+MAX_HISTORY_TURNS = int(os.getenv("MAX_HISTORY_TURNS", "20"))
+# Beyond this many (estimated) history tokens, older exchanges are folded into a summary...
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "4000"))
+# ...keeping this many recent exchanges word for word.
+HISTORY_KEEP_TURNS = int(os.getenv("HISTORY_KEEP_TURNS", "6"))
+SESSION_SWEEP_INTERVAL = 60
+# "memory" keeps conversations in the worker; "sqlite" stores them in SESSION_DB, shared by all workers.
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")
+SESSION_DB = os.getenv("SESSION_DB", "sessions.db")
+# Seconds to wait for the model before giving up on a request.
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+# How often an in-flight request checks whether its client is still connected.
+DISCONNECT_POLL_INTERVAL = 0.5
+# Seconds between heartbeat events on an idle stream, so proxies keep the connection open.
+STREAM_HEARTBEAT_INTERVAL = float(os.getenv("STREAM_HEARTBEAT_INTERVAL", "15"))
+# Replies one WebSocket connection may be generating at the same time.
+WS_MAX_IN_FLIGHT = int(os.getenv("WS_MAX_IN_FLIGHT", "8"))
+# Calls to the model running at once, how many more may wait for a turn and for how long.
+MAX_CONCURRENT_LLM_CALLS = int(os.getenv("MAX_CONCURRENT_LLM_CALLS", "16"))
+LLM_QUEUE_SIZE = int(os.getenv("LLM_QUEUE_SIZE", "64"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "10"))
+# Chat messages each client (IP address) may send per minute, and in a burst. 0 disables the limit.
+RATE_LIMIT_PER_MINUTE = float(os.getenv("RATE_LIMIT_PER_MINUTE", "30"))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "10"))
+# Seconds clients are asked to wait after the model reports its quota is exhausted.
+QUOTA_RETRY_AFTER = 30
+
+GENERATION_CONFIG = {
+    "max_output_tokens": 4000,
+    "temperature": 0.7,
+}
+SUMMARY_GENERATION_CONFIG = {
+    "max_output_tokens": 1000,
+    "temperature": 0.2,
+}
+
+sessions = SessionManager(
+    max_sessions=MAX_SESSIONS,
+    idle_timeout=SESSION_IDLE_TIMEOUT,
+    max_history_turns=MAX_HISTORY_TURNS,
+    history_token_budget=HISTORY_TOKEN_BUDGET,
+    keep_turns=HISTORY_KEEP_TURNS,
+    store=create_session_store(SESSION_STORE, SESSION_DB)
+)
+metrics.ACTIVE_SESSIONS.set_function(lambda: len(sessions))
+
+upstream = ConcurrencyLimiter(MAX_CONCURRENT_LLM_CALLS, LLM_QUEUE_SIZE, LLM_QUEUE_TIMEOUT)
+rate_limiter = RateLimiter(RATE_LIMIT_PER_MINUTE, RATE_LIMIT_BURST)
+metrics.LLM_CALLS_ACTIVE.set_function(lambda: upstream.active)
+metrics.LLM_CALLS_QUEUED.set_function(lambda: upstream.waiting)
 
 app = FastAPI(
     title="Gemini AI Chatbot API",
@@ -71,16 +174,211 @@ class ChatRequest:
         self.session_id = session_id
         self.timestamp = datetime.now().isoformat()
 
-chat_session = None
+    def log_fields(self) -> dict:
+        """The request's details for a structured log record, with the prompt shortened."""
+        return {
+            "session_id": self.session_id,
+            "prompt": truncate(self.prompt, LOG_PROMPT_CHARS),
+            "prompt_chars": len(self.prompt),
+        }
 
-@app.on_event("startup")
-async def startup_event():
-    global chat_session
+class ClientDisconnected(Exception):
+    """Raised when the client goes away before its response is ready."""
+
+async def run_until_disconnected(request: Request, coro, timeout: float):
+    """
+    Awaits `coro` without blocking the event loop, cancelling it on timeout or
+    as soon as the client disconnects so no more tokens are spent on it.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            done, _ = await asyncio.wait({task}, timeout=min(DISCONNECT_POLL_INTERVAL, remaining))
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                raise ClientDisconnected()
+    finally:
+        if not task.done():
+            task.cancel()
+
+async def with_document_context(session, prompt: str) -> str:
+    """
+    Adds the passages of the session's uploaded files that are most relevant to a message.
+    Only the message itself is kept in the history, so excerpts are not resent on later turns.
+    """
+    if not session.documents:
+        return prompt
+    try:
+        excerpts = await documents.search(session.session_id, session.documents, prompt)
+    except Exception as e:
+        logger.warning(f"Could not search the files of session {session.session_id}: {str(e)}")
+        return prompt
+    if not excerpts:
+        return prompt
+    context = "\n\n".join(f"[From {filename}]\n{text}" for filename, text in excerpts)
+    return (
+        "Excerpts from files the user uploaded, for reference where relevant:\n\n"
+        f"{context}\n\n"
+        f"User message: {prompt}"
+    )
+
+async def session_call(function, *args):
+    """
+    Runs a `SessionManager` call. With a persistent store it may wait for the database, so it runs
+    on a worker thread instead of holding up the event loop.
+    """
+    if not sessions.store.persistent:
+        return function(*args)
+    return await asyncio.to_thread(function, *args)
+
+async def generate_reply(session, prompt: str) -> str:
+    """Sends one message in a session's conversation and records the exchange."""
+    # Messages of one session are answered one at a time so each sees the previous reply.
+    async with session.lock:
+        message = await with_document_context(session, prompt)
+        async with upstream.slot():
+            started = time.perf_counter()
+            reply = await llm.complete(session.context(), message, GENERATION_CONFIG)
+        metrics.LLM_LATENCY.labels("blocking").observe(time.perf_counter() - started)
+        await session_call(sessions.add_turn, session, prompt, reply)
+        schedule_compaction(session)
+        return reply
+
+async def stream_reply(session, prompt: str):
+    """Yields the model's reply to a message piece by piece, then records the exchange."""
+    async with session.lock:
+        message = await with_document_context(session, prompt)
+        async with upstream.slot():
+            started = time.perf_counter()
+            parts = []
+            async for text in llm.stream(session.context(), message, GENERATION_CONFIG):
+                parts.append(text)
+                yield text
+        reply = "".join(parts)
+        metrics.LLM_LATENCY.labels("stream").observe(time.perf_counter() - started)
+        await session_call(sessions.add_turn, session, prompt, reply)
+        schedule_compaction(session)
+
+async def compact_history(session):
+    """Folds a session's older exchanges into its rolling summary."""
+    folded = sessions.turns_to_fold(session)
+    if not folded:
+        return
+    transcript = "\n\n".join(
+        f"{'User' if entry['role'] == 'user' else 'Assistant'}: {' '.join(entry['parts'])}"
+        for entry in folded
+    )
+    prompt = (
+        "Update the summary of a conversation between a user and an AI assistant with the new exchanges below. "
+        "Keep every fact, decision, name, number and open question the assistant may need later; "
+        "drop small talk. Answer with the updated summary only.\n\n"
+        f"Current summary:\n{session.summary or '(none)'}\n\n"
+        f"New exchanges:\n{transcript}"
+    )
     try:
-        chat_session = model.start_chat(history=[])
-        logger.info("Chat session initialized successfully")
+        async with upstream.slot():
+            summary = (await llm.complete([], prompt, SUMMARY_GENERATION_CONFIG)).strip()
+    except Rejected:
+        # The service is busy; the next message will try again.
+        metrics.HISTORY_COMPACTIONS.labels("deferred").inc()
+        return
     except Exception as e:
-        logger.error(f"Failed to initialize chat session: {str(e)}")
+        logger.warning(f"Could not summarize the history of session {session.session_id}: {str(e)}")
+        metrics.HISTORY_COMPACTIONS.labels("error").inc()
+        return
+
+    try:
+        folded_now = await session_call(sessions.fold, session, folded, summary)
+    except Exception as e:
+        logger.warning(f"Could not save the summary of session {session.session_id}: {str(e)}")
+        metrics.HISTORY_COMPACTIONS.labels("error").inc()
+        return
+    if folded_now:
+        logger.info(f"Folded {len(folded) // 2} exchanges of session {session.session_id} into its summary")
+        metrics.HISTORY_COMPACTIONS.labels("success").inc()
+    else:
+        # The history was trimmed while the summary was being written.
+        metrics.HISTORY_COMPACTIONS.labels("stale").inc()
+
+def schedule_compaction(session):
+    """Starts summarizing a session's older exchanges in the background, so the next message does not wait for it."""
+    if session.compaction is not None and not session.compaction.done():
+        return
+    if sessions.turns_to_fold(session):
+        session.compaction = asyncio.create_task(compact_history(session))
+
+ERROR_MESSAGES = {
+    "api_key": "API key error. Please check your configuration.",
+    "quota": "API quota exceeded. Please try again later.",
+    "safety": "Your message was blocked by safety filters. Please rephrase your request.",
+    "other": "Sorry, I encountered an error processing your request. Please try again.",
+}
+
+def error_category(e: Exception) -> str:
+    """Tells which kind of model failure an exception is: "api_key", "quota", "safety" or "other"."""
+    if "API_KEY" in str(e):
+        return "api_key"
+    elif "quota" in str(e).lower():
+        return "quota"
+    elif "safety" in str(e).lower():
+        return "safety"
+    return "other"
+
+def describe_error(e: Exception) -> str:
+    """Turns an exception from the model into a message that can be shown to the user, and counts it."""
+    category = error_category(e)
+    metrics.ERRORS.labels(category).inc()
+    return ERROR_MESSAGES[category]
+
+REJECTION_MESSAGES = {
+    "busy": "The service is busy right now. Please try again in a moment.",
+    "rate_limited": "You're sending messages too quickly. Please wait a moment and try again.",
+}
+
+def client_key(connection) -> str:
+    """Identifies the client a request or WebSocket comes from, for rate limiting."""
+    return connection.client.host if connection.client else "unknown"
+
+def too_many_requests(e: Rejected) -> JSONResponse:
+    """Builds the 429 response for a rejected request."""
+    metrics.REJECTIONS.labels(e.reason).inc()
+    return JSONResponse(
+        status_code=429,
+        headers={"Retry-After": str(e.retry_after)},
+        content={
+            "response": REJECTION_MESSAGES.get(e.reason, REJECTION_MESSAGES["busy"]),
+            "status": "error",
+            "error": e.reason
+        }
+    )
+
+def sse_event(event: str, data: dict) -> str:
+    """Formats one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def evict_idle_sessions():
+    while True:
+        await asyncio.sleep(SESSION_SWEEP_INTERVAL)
+        evicted = await session_call(sessions.evict_idle)
+        if evicted:
+            logger.info(f"Evicted {evicted} idle sessions, {await session_call(len, sessions)} active")
+
+@app.on_event("startup")
+async def startup_event():
+    app.state.session_sweeper = asyncio.create_task(evict_idle_sessions())
+    logger.info("Session manager initialized successfully")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    app.state.session_sweeper.cancel()
+    documents.close()
+    await llm.close()
 
 @app.get("/", response_class=HTMLResponse)
 def get_chat(request: Request):
@@ -95,112 +393,369 @@ def get_chat(request: Request):
     )
 
 @app.post("/api/chat")
-async def chat(prompt: str = Form(...), session_id: Optional[str] = Form(None)):
+async def chat(request: Request, prompt: str = Form(...), session_id: Optional[str] = Form(None)):
     """
     Process user chat messages and return AI responses
     """
-    global chat_session
-    
+    started = time.perf_counter()
+    outcome = "error"
     try:
         chat_request = ChatRequest(prompt, session_id)
-        logger.info(f"Processing chat request: {chat_request.__dict__}")
-        
-        if chat_session is None:
-            chat_session = model.start_chat(history=[])
-            logger.info("Chat session reinitialized")
-        
-        response = chat_session.send_message(
-            prompt,
-            safety_settings=[
-                {
-                    "category": "HARM_CATEGORY_HARASSMENT",
-                    "threshold": "BLOCK_ONLY_HIGH"
-                },
-                {
-                    "category": "HARM_CATEGORY_HATE_SPEECH",
-                    "threshold": "BLOCK_ONLY_HIGH"
-                },
-                {
-                    "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
-                    "threshold": "BLOCK_ONLY_HIGH"
-                },
-                {
-                    "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
-                    "threshold": "BLOCK_ONLY_HIGH"
-                }
-            ],
-            generation_config={
-                "max_output_tokens": 4000,
-                "temperature": 0.7,
-            }
-        )
+        logger.info("Processing chat request", extra=chat_request.log_fields())
+        rate_limiter.check(client_key(request))
         
-        reply = response.text
-        logger.info(f"Successfully generated response for prompt: {prompt[:50]}...")
+        session = await session_call(sessions.get, session_id)
+        reply = await run_until_disconnected(request, generate_reply(session, prompt), LLM_TIMEOUT_SECONDS)
+        logger.info("Successfully generated response", extra=chat_request.log_fields())
+        outcome = "success"
         
         return JSONResponse(
             content={
                 "response": reply,
-                "session_id": session_id,
+                "session_id": session.session_id,
                 "timestamp": datetime.now().isoformat(),
                 "status": "success"
             }
         )
+    except ClientDisconnected:
+        logger.info("Client disconnected, chat request cancelled")
+        outcome = "cancelled"
+        return JSONResponse(status_code=499, content={"status": "cancelled"})
+    except Rejected as e:
+        logger.warning(f"Chat request rejected: {e.reason}")
+        outcome = "rejected"
+        return too_many_requests(e)
+    except asyncio.TimeoutError:
+        logger.warning(f"Chat request timed out after {LLM_TIMEOUT_SECONDS}s")
+        metrics.ERRORS.labels("timeout").inc()
+        outcome = "timeout"
+        return JSONResponse(
+            status_code=504,
+            content={
+                "response": "The AI service took too long to respond. Please try again.",
+                "status": "error",
+                "error": "timeout"
+            }
+        )
     except Exception as e:
         logger.error(f"Error processing chat request: {str(e)}", exc_info=True)
         
-        error_message = "Sorry, I encountered an error processing your request. Please try again."
-        if "API_KEY" in str(e):
-            error_message = "API key error. Please check your configuration."
-        elif "quota" in str(e).lower():
-            error_message = "API quota exceeded. Please try again later."
-        elif "safety" in str(e).lower():
-            error_message = "Your message was blocked by safety filters. Please rephrase your request."
-        
+        # An exhausted quota is not fixed by retrying at once, so tell clients to back off.
+        quota_exceeded = error_category(e) == "quota"
         return JSONResponse(
-            status_code=500,
+            status_code=429 if quota_exceeded else 500,
+            headers={"Retry-After": str(QUOTA_RETRY_AFTER)} if quota_exceeded else None,
             content={
-                "response": error_message,
+                "response": describe_error(e),
                 "status": "error",
                 "error": str(e)
             }
         )
+    finally:
+        # The whole reply arrives at once, so its first token comes when the request finishes.
+        metrics.record_request("chat", outcome, started, time.perf_counter() if outcome == "success" else None)
+
+@app.post("/api/chat/stream")
+async def chat_stream(request: Request, prompt: str = Form(...), session_id: Optional[str] = Form(None)):
+    """
+    Stream the AI response as server-sent events: "token" events carry pieces of the reply,
+    followed by a single "done" or "error" event. "heartbeat" events are sent while waiting.
+    """
+    started = time.perf_counter()
+    chat_request = ChatRequest(prompt, session_id)
+    logger.info("Processing streaming chat request", extra=chat_request.log_fields())
+    try:
+        rate_limiter.check(client_key(request))
+        if upstream.is_full():
+            raise Rejected("busy", upstream.retry_after())
+    except Rejected as e:
+        logger.warning(f"Streaming chat request rejected: {e.reason}")
+        metrics.record_request("stream", "rejected", started)
+        return too_many_requests(e)
+    session = await session_call(sessions.get, session_id)
+
+    async def events():
+        queue = asyncio.Queue()
+
+        async def relay():
+            try:
+                async for text in stream_reply(session, prompt):
+                    await queue.put(("token", text))
+                await queue.put(("done", None))
+            except Exception as e:
+                await queue.put(("error", e))
+
+        # The timeout catches a stalled model: it applies to the first token and to each gap
+        # between tokens, not to the whole reply, which may legitimately take longer.
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + LLM_TIMEOUT_SECONDS
+        producer = asyncio.create_task(relay())
+        outcome = "cancelled"
+        first_token_at = None
+        try:
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    logger.warning(f"Streaming chat request timed out: no reply from the model for {LLM_TIMEOUT_SECONDS}s")
+                    metrics.ERRORS.labels("timeout").inc()
+                    outcome = "timeout"
+                    yield sse_event("error", {
+                        "response": "The AI service took too long to respond. Please try again.",
+                        "error": "timeout"
+                    })
+                    return
+                try:
+                    kind, value = await asyncio.wait_for(queue.get(), min(STREAM_HEARTBEAT_INTERVAL, remaining))
+                except asyncio.TimeoutError:
+                    yield sse_event("heartbeat", {})
+                    continue
+
+                if kind == "token":
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    deadline = loop.time() + LLM_TIMEOUT_SECONDS
+                    yield sse_event("token", {"text": value})
+                elif kind == "done":
+                    logger.info("Successfully streamed response", extra=chat_request.log_fields())
+                    outcome = "success"
+                    yield sse_event("done", {
+                        "session_id": session.session_id,
+                        "timestamp": datetime.now().isoformat()
+                    })
+                    return
+                elif isinstance(value, Rejected):
+                    logger.warning(f"Streaming chat request rejected: {value.reason}")
+                    metrics.REJECTIONS.labels(value.reason).inc()
+                    outcome = "rejected"
+                    yield sse_event("error", {
+                        "response": REJECTION_MESSAGES[value.reason],
+                        "error": value.reason,
+                        "retry_after": value.retry_after
+                    })
+                    return
+                else:
+                    logger.error(f"Error processing streaming chat request: {str(value)}", exc_info=value)
+                    outcome = "error"
+                    yield sse_event("error", {"response": describe_error(value), "error": str(value)})
+                    return
+        finally:
+            # Also reached when the client disconnects, which stops generation.
+            producer.cancel()
+            metrics.record_request("stream", outcome, started, first_token_at)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.websocket("/ws/chat")
+async def chat_websocket(websocket: WebSocket):
+    """
+    Chat over one long-lived connection. The client sends JSON messages:
+
+        {"type": "chat", "id": "...", "session_id": "...", "prompt": "..."}
+        {"type": "cancel", "id": "..."}
+
+    Several requests, for any number of sessions, can be in flight at once. Each reply is streamed
+    back as "token" messages followed by one "done", "error" or "cancelled" message, all carrying
+    the request's "id".
+    """
+    await websocket.accept()
+    in_flight = {}
+    send_lock = asyncio.Lock()
+
+    async def send(message: dict):
+        async with send_lock:
+            await websocket.send_json(message)
+
+    def rejection(request_id: str, e: Rejected) -> dict:
+        logger.warning(f"WebSocket chat request rejected: {e.reason}")
+        metrics.REJECTIONS.labels(e.reason).inc()
+        return {
+            "type": "error",
+            "id": request_id,
+            "response": REJECTION_MESSAGES[e.reason],
+            "error": e.reason,
+            "retry_after": e.retry_after
+        }
+
+    async def generate(request_id: str, session, chat_request: ChatRequest):
+        started = time.perf_counter()
+        outcome = "cancelled"
+        first_token_at = None
+
+        async def relay():
+            nonlocal first_token_at
+            replies = stream_reply(session, chat_request.prompt)
+            try:
+                while True:
+                    # Only a stalled model times out: the limit applies to the first token and to
+                    # each gap between tokens, not to the whole reply.
+                    try:
+                        text = await asyncio.wait_for(replies.__anext__(), LLM_TIMEOUT_SECONDS)
+                    except StopAsyncIteration:
+                        return
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    await send({"type": "token", "id": request_id, "text": text})
+            finally:
+                await replies.aclose()
+
+        try:
+            await relay()
+            logger.info("Successfully streamed response", extra=chat_request.log_fields())
+            outcome = "success"
+            await send({
+                "type": "done",
+                "id": request_id,
+                "session_id": session.session_id,
+                "timestamp": datetime.now().isoformat()
+            })
+        except asyncio.TimeoutError:
+            logger.warning(f"WebSocket chat request timed out: no reply from the model for {LLM_TIMEOUT_SECONDS}s")
+            metrics.ERRORS.labels("timeout").inc()
+            outcome = "timeout"
+            await send({
+                "type": "error",
+                "id": request_id,
+                "response": "The AI service took too long to respond. Please try again.",
+                "error": "timeout"
+            })
+        except WebSocketDisconnect:
+            pass
+        except Rejected as e:
+            outcome = "rejected"
+            await send(rejection(request_id, e))
+        except Exception as e:
+            logger.error(f"Error processing WebSocket chat request: {str(e)}", exc_info=True)
+            outcome = "error"
+            await send({"type": "error", "id": request_id, "response": describe_error(e), "error": str(e)})
+        finally:
+            in_flight.pop(request_id, None)
+            metrics.record_request("websocket", outcome, started, first_token_at)
+
+    try:
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+                message_type = message.get("type")
+            except (ValueError, AttributeError):
+                await send({"type": "error", "id": None, "error": "Messages must be JSON objects"})
+                continue
+            request_id = str(message.get("id") or uuid.uuid4().hex)
+
+            if message_type == "cancel":
+                task = in_flight.pop(request_id, None)
+                if task is not None:
+                    task.cancel()
+                    logger.info(f"Cancelled WebSocket chat request {request_id}")
+                    await send({"type": "cancelled", "id": request_id})
+            elif message_type == "chat":
+                prompt = message.get("prompt")
+                if not isinstance(prompt, str) or not prompt.strip():
+                    await send({"type": "error", "id": request_id, "error": "A non-empty prompt is required"})
+                elif request_id in in_flight:
+                    await send({"type": "error", "id": request_id, "error": "A request with this id is already in flight"})
+                elif len(in_flight) >= WS_MAX_IN_FLIGHT:
+                    await send({"type": "error", "id": request_id, "error": "Too many requests in flight on this connection"})
+                else:
+                    try:
+                        rate_limiter.check(client_key(websocket))
+                    except Rejected as e:
+                        await send(rejection(request_id, e))
+                        continue
+                    session_id = message.get("session_id")
+                    chat_request = ChatRequest(prompt, session_id)
+                    logger.info("Processing WebSocket chat request", extra=chat_request.log_fields())
+                    session = await session_call(sessions.get, session_id if isinstance(session_id, str) else None)
+                    in_flight[request_id] = asyncio.create_task(generate(request_id, session, chat_request))
+            else:
+                await send({"type": "error", "id": request_id, "error": f"Unknown message type: {message_type}"})
+    except WebSocketDisconnect:
+        logger.info("WebSocket client disconnected")
+    finally:
+        # Nobody is left to read the answers, so stop generating them.
+        for task in in_flight.values():
+            task.cancel()
 
 @app.post("/api/upload")
-async def upload_file(file: UploadFile = File(...)):
+async def upload_file(request: Request, session_id: Optional[str] = None):
+    """
+    Stream an uploaded file to disk, stored by the SHA-256 of its content. A client that sends
+    the hash in an `X-Content-SHA256` header gets an immediate answer, without its body being
+    read, when that file is already stored.
+
+    PDF, DOCX, XLSX and text files are indexed in the background; with a `session_id`, the file
+    is attached to that conversation and relevant passages are added to its messages.
+    """
+    started = time.perf_counter()
+    outcome = "error"
     try:
-        max_size = 5 * 1024 * 1024
-        file.file.seek(0, 2)
-        file_size = file.file.tell()
-        file.file.seek(0)
-        
-        if file_size > max_size:
+        known_path = upload_store.find(request.headers.get("x-content-sha256"))
+        known_document = documents.cached_document(known_path.name) if known_path is not None else None
+        # Files to attach to a conversation are read again unless their text was already extracted.
+        if known_path is not None and (not session_id or known_document is not None):
+            if session_id:
+                session = await session_call(sessions.get, session_id)
+                await session_call(sessions.attach_document, session, known_document)
+            metrics.UPLOADS.labels("true").inc()
+            outcome = "success"
+            return JSONResponse(
+                content={
+                    "status": "success",
+                    "sha256": known_path.name,
+                    "size": known_path.stat().st_size,
+                    "deduplicated": True,
+                    "indexed": known_document is not None,
+                    "message": "File already uploaded"
+                }
+            )
+
+        content_length = request.headers.get("content-length", "")
+        if content_length.isdigit() and int(content_length) > MAX_UPLOAD_SIZE + MULTIPART_OVERHEAD:
             raise HTTPException(status_code=400, detail="File too large (max 5MB)")
-        
-        allowed_types = [
-            "text/plain", "application/pdf", 
-            "image/jpeg", "image/png",
-            "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-            "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        ]
-        
-        if file.content_type not in allowed_types:
-            raise HTTPException(status_code=400, detail="Unsupported file type")
-        
-        file_location = f"{UPLOAD_DIR}/{file.filename}"
-        with open(file_location, "wb+") as file_object:
-            file_object.write(await file.read())
+
+        upload = await receive_upload(
+            request.stream(),
+            request.headers.get("content-type", ""),
+            upload_store,
+            ALLOWED_UPLOAD_TYPES
+        )
+        logger.info(f"Stored upload {upload['filename']} as {upload['sha256']} ({upload['size']} bytes)")
+        metrics.UPLOADS.labels(str(upload["deduplicated"]).lower()).inc()
+        metrics.UPLOAD_BYTES.inc(upload["size"])
+
+        indexed = upload["content_type"] in INDEXABLE_TYPES
+        if indexed:
+            document = {
+                "sha256": upload["sha256"],
+                "filename": upload["filename"],
+                "content_type": upload["content_type"]
+            }
+            documents.ingest(document)
+            if session_id:
+                session = await session_call(sessions.get, session_id)
+                await session_call(sessions.attach_document, session, document)
+        outcome = "success"
         
         return JSONResponse(
             content={
                 "status": "success",
-                "filename": file.filename,
-                "content_type": file.content_type,
-                "size": file_size,
+                "filename": upload["filename"],
+                "content_type": upload["content_type"],
+                "size": upload["size"],
+                "sha256": upload["sha256"],
+                "deduplicated": upload["deduplicated"],
+                "indexed": indexed,
                 "message": "File uploaded successfully"
             }
         )
+    except UploadError as e:
+        outcome = "rejected"
+        raise HTTPException(status_code=400, detail=str(e))
     except HTTPException as he:
+        outcome = "rejected"
         raise he
     except Exception as e:
         logger.error(f"File upload error: {str(e)}")
@@ -208,6 +763,15 @@ async def upload_file(file: UploadFile = File(...)):
             status_code=500,
             detail={"status": "error", "message": str(e)}
         )
+    finally:
+        metrics.record_request("upload", outcome, started)
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """
+    Expose request, latency, error, session and upload metrics in the Prometheus text format
+    """
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 @app.get("/api/health")
 async def health_check():
@@ -216,6 +780,8 @@ async def health_check():
         content={
             "status": "healthy",
             "version": app.version,
+            "active_sessions": await session_call(len, sessions),
+            "llm_backend": LLM_BACKEND,
             "timestamp": datetime.now().isoformat()
         }
     )
@@ -0,0 +1,83 @@
+import time
+from typing import Optional
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# Buckets in seconds, from a fast first token up to a long, fully generated answer.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+
+REQUESTS = Counter(
+    "chatbot_requests_total",
+    "Chat and upload requests handled, by endpoint and outcome.",
+    ["endpoint", "outcome"]
+)
+REQUEST_LATENCY = Histogram(
+    "chatbot_request_duration_seconds",
+    "Time from receiving a request to sending the last byte of its response.",
+    ["endpoint"],
+    buckets=LATENCY_BUCKETS
+)
+TIME_TO_FIRST_TOKEN = Histogram(
+    "chatbot_time_to_first_token_seconds",
+    "Time from receiving a chat request to sending the first piece of the reply.",
+    ["endpoint"],
+    buckets=LATENCY_BUCKETS
+)
+LLM_LATENCY = Histogram(
+    "chatbot_llm_duration_seconds",
+    "Time the model took to produce a complete reply, not counting time queued behind the session's previous message.",
+    ["mode"],
+    buckets=LATENCY_BUCKETS
+)
+ERRORS = Counter(
+    "chatbot_errors_total",
+    "Failed chat requests, by cause.",
+    ["category"]
+)
+REJECTIONS = Counter(
+    "chatbot_rejections_total",
+    "Chat requests turned away with a retry hint, by reason (busy or rate_limited).",
+    ["reason"]
+)
+LLM_CALLS_ACTIVE = Gauge(
+    "chatbot_llm_calls_active",
+    "Calls to the model currently running."
+)
+LLM_CALLS_QUEUED = Gauge(
+    "chatbot_llm_calls_queued",
+    "Calls to the model waiting for a free slot."
+)
+ACTIVE_SESSIONS = Gauge(
+    "chatbot_active_sessions",
+    "Conversations currently kept in memory."
+)
+HISTORY_COMPACTIONS = Counter(
+    "chatbot_history_compactions_total",
+    "Times older exchanges of a conversation were folded into its summary, by outcome.",
+    ["outcome"]
+)
+UPLOADS = Counter(
+    "chatbot_uploads_total",
+    "Files uploaded, by whether the content was already stored.",
+    ["deduplicated"]
+)
+UPLOAD_BYTES = Counter(
+    "chatbot_upload_bytes_total",
+    "File bytes received by uploads."
+)
+
+
+def record_request(endpoint: str, outcome: str, started: float, first_token_at: Optional[float] = None):
+    """
+    Counts a finished request and records its latency.
+
+    Args:
+        endpoint (str): Which endpoint handled it, e.g. "chat" or "stream".
+        outcome (str): "success", "error", "timeout", "cancelled" or "rejected".
+        started (float): `time.perf_counter()` when the request arrived.
+        first_token_at (float | None): `time.perf_counter()` when the first piece of the reply was sent.
+    """
+    REQUESTS.labels(endpoint, outcome).inc()
+    REQUEST_LATENCY.labels(endpoint).observe(time.perf_counter() - started)
+    if first_token_at is not None:
+        TIME_TO_FIRST_TOKEN.labels(endpoint).observe(first_token_at - started)
@@ -0,0 +1,287 @@
+import asyncio
+import heapq
+import json
+import logging
+import math
+import os
+import re
+import time
+import uuid
+from collections import Counter, OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PDF_TYPE = "application/pdf"
+DOCX_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+XLSX_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+TEXT_TYPE = "text/plain"
+INDEXABLE_TYPES = (PDF_TYPE, DOCX_TYPE, XLSX_TYPE, TEXT_TYPE)
+
+CHUNK_CHARS = 1200
+CHUNK_OVERLAP_CHARS = 200
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def extract_text(path: str, content_type: str) -> str:
+    """
+    Extracts the plain text of an uploaded PDF, DOCX, XLSX or text file.
+
+    Raises:
+        ValueError: If the content type cannot be indexed.
+    """
+    if content_type == PDF_TYPE:
+        from pypdf import PdfReader
+        return "\n\n".join(page.extract_text() or "" for page in PdfReader(path).pages)
+    if content_type == DOCX_TYPE:
+        from docx import Document
+        document = Document(path)
+        paragraphs = [paragraph.text for paragraph in document.paragraphs]
+        for table in document.tables:
+            paragraphs.extend("\t".join(cell.text for cell in row.cells) for row in table.rows)
+        return "\n\n".join(paragraphs)
+    if content_type == XLSX_TYPE:
+        from openpyxl import load_workbook
+        # Given a path, openpyxl insists on an .xlsx extension, which stored uploads do not have.
+        with open(path, "rb") as xlsx_file:
+            workbook = load_workbook(xlsx_file, read_only=True, data_only=True)
+            try:
+                sheets = []
+                for sheet in workbook.worksheets:
+                    rows = [
+                        "\t".join("" if value is None else str(value) for value in row)
+                        for row in sheet.iter_rows(values_only=True)
+                        if any(value is not None for value in row)
+                    ]
+                    sheets.append(f"Sheet: {sheet.title}\n" + "\n".join(rows))
+                return "\n\n".join(sheets)
+            finally:
+                workbook.close()
+    if content_type == TEXT_TYPE:
+        return Path(path).read_text(encoding="utf-8", errors="replace")
+    raise ValueError(f"Cannot index files of type {content_type}")
+
+
+def chunk_text(text: str, chunk_chars: int = CHUNK_CHARS, overlap_chars: int = CHUNK_OVERLAP_CHARS) -> List[str]:
+    """
+    Splits text into chunks of about `chunk_chars` characters, breaking at paragraph, line or word
+    boundaries where possible, with `overlap_chars` repeated between neighbouring chunks.
+    """
+    text = re.sub(r"[ \t]+", " ", text).strip()
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_chars, len(text))
+        if end < len(text):
+            for separator in ("\n\n", "\n", " "):
+                cut = text.rfind(separator, start + chunk_chars // 2, end)
+                if cut != -1:
+                    end = cut
+                    break
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        start = max(end - overlap_chars, start + 1)
+    return chunks
+
+
+def extract_chunks(path: str, content_type: str) -> List[str]:
+    """Extracts and chunks one file. Runs in the ingestion worker processes."""
+    return chunk_text(extract_text(path, content_type))
+
+
+def tokenize(text: str) -> List[str]:
+    return [token.lower() for token in TOKEN_PATTERN.findall(text)]
+
+
+class BM25Index:
+    """An in-memory Okapi BM25 keyword index over a list of texts."""
+
+    def __init__(self, texts: List[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.lengths = []
+        self.postings = defaultdict(list)
+        for position, text in enumerate(texts):
+            term_counts = Counter(tokenize(text))
+            self.lengths.append(sum(term_counts.values()))
+            for term, count in term_counts.items():
+                self.postings[term].append((position, count))
+        self.average_length = sum(self.lengths) / max(len(self.lengths), 1)
+        self.idf = {
+            term: math.log(1 + (len(texts) - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self.postings.items()
+        }
+
+    def search(self, query: str, k: int = 4) -> List[Tuple[int, float]]:
+        """Returns the positions and scores of the `k` texts that best match the query, best first."""
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for position, count in self.postings[term]:
+                length_norm = 1 - self.b + self.b * self.lengths[position] / self.average_length
+                scores[position] += idf * count * (self.k1 + 1) / (count + self.k1 * length_norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+
+class DocumentLibrary:
+    """
+    Turns uploaded files into searchable chunks and finds the ones relevant to a chat message.
+
+    Text is extracted in a pool of `workers` processes, once per file content: the chunks are
+    saved next to the stored upload as `<sha256>.chunks.json` (a line with the file's name and
+    type, then a line with its chunks), so other workers and later restarts reuse them. Each
+    session gets a BM25 index over the chunks of its own files, built when first searched and
+    kept for the `max_indexes` most recently used sessions. A file that cannot be read is left
+    out of the index and only tried again after `retry_failed_after` seconds.
+    """
+
+    def __init__(self, upload_store, workers: int = 2, top_k: int = 4, max_indexes: int = 256, max_documents: int = 256,
+                 retry_failed_after: float = 300):
+        self.upload_store = upload_store
+        self.workers = workers
+        self.top_k = top_k
+        self.max_indexes = max_indexes
+        self.max_documents = max_documents
+        self.retry_failed_after = retry_failed_after
+        self._pool = None
+        self._documents = OrderedDict()
+        # Files that could not be indexed, by content hash, with the time they may be tried again.
+        self._failed = OrderedDict()
+        self._ingesting = {}
+        self._indexes = OrderedDict()
+
+    def _cache_path(self, digest: str) -> Path:
+        path = self.upload_store.path_for(digest)
+        return path.with_name(f"{path.name}.chunks.json")
+
+    def _write_cache(self, cache_path: Path, payload: str):
+        # Written aside and moved into place, so other workers never read a half-written file.
+        tmp_path = self.upload_store.tmp_dir / uuid.uuid4().hex
+        try:
+            tmp_path.write_text(payload, encoding="utf-8")
+            os.replace(tmp_path, cache_path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+    def cached_document(self, digest: str) -> Optional[dict]:
+        """Returns the "filename" and "content_type" a file was indexed with, if it was indexed before."""
+        cache_path = self._cache_path(digest)
+        if not cache_path.is_file():
+            return None
+        with open(cache_path, encoding="utf-8") as cache_file:
+            cached = json.loads(cache_file.readline())
+        return {"sha256": digest, "filename": cached["filename"], "content_type": cached["content_type"]}
+
+    def ingest(self, document: dict) -> asyncio.Task:
+        """
+        Starts extracting and chunking a stored upload in the background, unless that is already
+        done or under way.
+
+        Args:
+            document (dict): The upload's "sha256", "filename" and "content_type".
+
+        Returns:
+            asyncio.Task: Resolves to the file's chunks.
+        """
+        digest = document["sha256"]
+        task = self._ingesting.get(digest)
+        if task is None:
+            task = asyncio.create_task(self._load_chunks(document))
+            self._ingesting[digest] = task
+            task.add_done_callback(lambda _: self._finished(document))
+        return task
+
+    def _finished(self, document: dict):
+        digest = document["sha256"]
+        task = self._ingesting.pop(digest)
+        if task.cancelled():
+            return
+        if task.exception() is None:
+            self._failed.pop(digest, None)
+            return
+        logger.warning(f"Could not index {document['filename']} ({digest}): {str(task.exception())}")
+        self._failed[digest] = time.monotonic() + self.retry_failed_after
+        self._failed.move_to_end(digest)
+        while len(self._failed) > self.max_documents:
+            self._failed.popitem(last=False)
+
+    async def _load_chunks(self, document: dict) -> List[str]:
+        digest = document["sha256"]
+        if digest in self._documents:
+            self._documents.move_to_end(digest)
+            return self._documents[digest]
+
+        cache_path = self._cache_path(digest)
+        if cache_path.is_file():
+            cached = await asyncio.to_thread(cache_path.read_text, encoding="utf-8")
+            chunks = json.loads(cached.split("\n", 1)[1])
+        else:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            loop = asyncio.get_running_loop()
+            path = str(self.upload_store.path_for(digest))
+            chunks = await loop.run_in_executor(self._pool, extract_chunks, path, document["content_type"])
+            payload = json.dumps({
+                "filename": document["filename"],
+                "content_type": document["content_type"],
+            }) + "\n" + json.dumps(chunks)
+            await asyncio.to_thread(self._write_cache, cache_path, payload)
+            logger.info(f"Indexed {document['filename']} ({digest}) into {len(chunks)} chunks")
+
+        self._documents[digest] = chunks
+        while len(self._documents) > self.max_documents:
+            self._documents.popitem(last=False)
+        return chunks
+
+    async def search(self, session_id: str, documents: List[dict], query: str) -> List[Tuple[str, str]]:
+        """
+        Finds the chunks of a session's files most relevant to a message, waiting for files that
+        are still being indexed. Files that cannot be read are skipped, and only tried again once
+        `retry_failed_after` seconds have passed.
+
+        Returns:
+            list[tuple[str, str]]: Up to `top_k` (filename, chunk text) pairs, best first.
+        """
+        key = tuple(document["sha256"] for document in documents)
+        now = time.monotonic()
+        cached = self._indexes.get(session_id)
+        if cached is None or cached[0] != key or (cached[1] is not None and cached[1] <= now):
+            passages = []
+            retry_times = []
+            for document in documents:
+                digest = document["sha256"]
+                retry_at = self._failed.get(digest)
+                if retry_at is not None and retry_at > now:
+                    retry_times.append(retry_at)
+                    continue
+                try:
+                    # Shielded: the indexing task is shared with other requests, which must not be
+                    # cancelled along with this one.
+                    chunks = await asyncio.shield(self.ingest(document))
+                except Exception:
+                    # Already logged and recorded when indexing failed.
+                    retry_times.append(self._failed.get(digest, now))
+                    continue
+                passages.extend((document["filename"], chunk) for chunk in chunks)
+            # Tokenizing thousands of chunks would hold up the event loop.
+            index = await asyncio.to_thread(BM25Index, [text for _, text in passages])
+            # An index missing a file is rebuilt once that file may be tried again.
+            cached = (key, min(retry_times, default=None), index, passages)
+            self._indexes[session_id] = cached
+        self._indexes.move_to_end(session_id)
+        while len(self._indexes) > self.max_indexes:
+            self._indexes.popitem(last=False)
+
+        _, _, index, passages = cached
+        return [passages[position] for position, _ in index.search(query, self.top_k)]
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
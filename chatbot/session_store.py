@@ -0,0 +1,141 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional, Tuple
+
+SESSION_STORES = ("memory", "sqlite")
+
+
+class MemorySessionStore:
+    """
+    Keeps conversations only in the worker's own memory (in the `SessionManager`), so they are lost
+    on restart and not shared between workers. Use it with a single worker.
+    """
+
+    persistent = False
+
+    def load(self, session_id: str) -> Optional[Tuple[list, str, list, int]]:
+        return None
+
+    def save(self, session_id: str, history: list, summary: str, documents: list, version: int) -> Optional[int]:
+        return version + 1
+
+    def evict_idle(self, idle_timeout: float) -> int:
+        return 0
+
+    def count(self) -> Optional[int]:
+        return None
+
+
+class SQLiteSessionStore:
+    """
+    Persists each conversation's history, summary and attached files in a SQLite database in WAL mode, so every
+    worker of `uvicorn --workers N` sees the same conversations and they survive restarts.
+
+    Each save bumps the session's version, which tells a worker whether its cached copy is stale.
+    A save only succeeds if the stored version is still the one the worker loaded, so two workers
+    answering the same conversation cannot overwrite each other's turns.
+    """
+
+    persistent = True
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): Location of the SQLite database file. Parent folders are created if needed.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # With WAL, NORMAL only syncs at checkpoints: a power loss may lose the last turns, never corrupt the file.
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " session_id TEXT PRIMARY KEY,"
+            " history TEXT NOT NULL,"
+            " summary TEXT NOT NULL,"
+            " documents TEXT NOT NULL DEFAULT '[]',"
+            " version INTEGER NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(sessions)")]
+        if "documents" not in columns:
+            self._conn.execute("ALTER TABLE sessions ADD COLUMN documents TEXT NOT NULL DEFAULT '[]'")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)")
+        self._conn.commit()
+
+    def load(self, session_id: str) -> Optional[Tuple[list, str, list, int]]:
+        """
+        Returns:
+            tuple[list, str, list, int] | None: The session's history, summary, attached documents
+            and version, or None if it is not stored.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT history, summary, documents, version FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        history, summary, documents, version = row
+        return json.loads(history), summary, json.loads(documents), version
+
+    def save(self, session_id: str, history: list, summary: str, documents: list, version: int) -> Optional[int]:
+        """
+        Stores a session's current state, provided the stored copy is still at `version`
+        (0 for a session that is not stored yet).
+
+        Returns:
+            int | None: The session's new version, or None if another worker saved it in the meantime.
+        """
+        values = (json.dumps(history), summary, json.dumps(documents), time.time())
+        with self._lock:
+            # Plain INSERT OR IGNORE and a conditional UPDATE rather than UPSERT or RETURNING,
+            # which need SQLite 3.35, newer than what some Python 3.9 builds ship.
+            if version == 0:
+                saved = self._conn.execute(
+                    "INSERT OR IGNORE INTO sessions (history, summary, documents, updated_at, session_id, version)"
+                    " VALUES (?, ?, ?, ?, ?, 1)",
+                    values + (session_id,),
+                ).rowcount
+            else:
+                saved = self._conn.execute(
+                    "UPDATE sessions SET history = ?, summary = ?, documents = ?, updated_at = ?, version = version + 1"
+                    " WHERE session_id = ? AND version = ?",
+                    values + (session_id, version),
+                ).rowcount
+            self._conn.commit()
+        return version + 1 if saved else None
+
+    def evict_idle(self, idle_timeout: float) -> int:
+        """Deletes sessions not updated for `idle_timeout` seconds. Returns how many were deleted."""
+        with self._lock:
+            deleted = self._conn.execute(
+                "DELETE FROM sessions WHERE updated_at < ?", (time.time() - idle_timeout,)
+            ).rowcount
+            self._conn.commit()
+        return deleted
+
+    def count(self) -> Optional[int]:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+def create_session_store(kind: str = "memory", path: str = "sessions.db"):
+    """
+    Creates the session store selected by configuration.
+
+    Args:
+        kind (str): One of `SESSION_STORES`.
+        path (str): Database file of the "sqlite" store.
+
+    Raises:
+        ValueError: If `kind` is not one of `SESSION_STORES`.
+    """
+    if kind == "memory":
+        return MemorySessionStore()
+    if kind == "sqlite":
+        return SQLiteSessionStore(path)
+    raise ValueError(f"Unknown session store {kind!r}, expected one of {', '.join(SESSION_STORES)}")
@@ -0,0 +1,214 @@
+import asyncio
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional
+
+from session_store import MemorySessionStore
+
+MAX_SESSION_ID_LENGTH = 128
+# Times a change is reapplied on top of another worker's newer copy before giving up, waiting
+# a random delay of up to SAVE_RETRY_DELAY seconds times the attempt number in between, so
+# workers saving the same session at once do not keep colliding.
+MAX_SAVE_ATTEMPTS = 10
+SAVE_RETRY_DELAY = 0.005
+# Rough size of a token in characters, good enough to budget history without a tokenizer.
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(entries) -> int:
+    """Estimates how many tokens a list of history entries takes up."""
+    return sum(len(part) for entry in entries for part in entry["parts"]) // CHARS_PER_TOKEN
+
+
+class Session:
+    """One client's conversation, stored as Gemini chat history entries."""
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.history = []
+        # Older exchanges that were folded out of `history`, summarized.
+        self.summary = ""
+        # Uploaded files attached to the conversation: their "sha256", "filename" and "content_type".
+        self.documents = []
+        self.lock = asyncio.Lock()
+        self.compaction = None
+        # Version of the stored copy this session matches.
+        self.version = 0
+        self.created_at = time.time()
+        self.last_used = time.monotonic()
+
+    def add_turn(self, prompt: str, reply: str, max_turns: Optional[int] = None):
+        """Appends a user message and the model's reply, keeping at most `max_turns` exchanges."""
+        self.history.append({"role": "user", "parts": [prompt]})
+        self.history.append({"role": "model", "parts": [reply]})
+        if max_turns and len(self.history) > 2 * max_turns:
+            del self.history[:len(self.history) - 2 * max_turns]
+
+    def context(self) -> list:
+        """Returns the history to send to the model: the summary of older exchanges, then the recent ones."""
+        if not self.summary:
+            return list(self.history)
+        return [
+            {"role": "user", "parts": [f"Summary of our conversation so far:\n{self.summary}"]},
+            {"role": "model", "parts": ["Thanks, I'll keep that in mind."]},
+        ] + self.history
+
+
+class SessionManager:
+    """
+    Keeps a separate chat history per `session_id`.
+
+    At most `max_sessions` sessions are kept; beyond that the least recently used one is dropped.
+    Sessions idle for longer than `idle_timeout` seconds are dropped too, and each session keeps
+    only its last `max_history_turns` exchanges, so memory and the history sent with every
+    request stay bounded however long the service runs.
+
+    Once a session's history grows past `history_token_budget` tokens (or reaches
+    `max_history_turns` exchanges), all but its last `keep_turns` exchanges can be folded
+    into its summary, so long conversations keep a steady cost per message.
+
+    With a persistent `store`, the sessions kept here are only a cache: every change is saved to
+    the store, and a session is reloaded from it when it is not cached or another worker changed it.
+    If another worker saved the session since it was loaded, the change is applied again on top of
+    the stored copy, so concurrent turns are merged rather than lost. Those methods wait for the
+    store, so async code should call them through `asyncio.to_thread`.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 1000,
+        idle_timeout: float = 1800,
+        max_history_turns: int = 20,
+        history_token_budget: int = 4000,
+        keep_turns: int = 6,
+        store=None
+    ):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.max_history_turns = max_history_turns
+        self.history_token_budget = history_token_budget
+        self.keep_turns = keep_turns
+        self.store = store or MemorySessionStore()
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        # Held while a session is loaded or saved, so this worker's own changes are never applied twice.
+        self._store_lock = threading.Lock()
+
+    def get(self, session_id: Optional[str] = None) -> Session:
+        """
+        Returns the session for `session_id`, creating it if it does not exist or was evicted.
+        A new random id is assigned when `session_id` is missing or invalid.
+        """
+        if not session_id or len(session_id) > MAX_SESSION_ID_LENGTH:
+            session_id = uuid.uuid4().hex
+
+        with self._lock:
+            self._evict_idle(time.monotonic())
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = Session(session_id)
+                self._sessions[session_id] = session
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            else:
+                self._sessions.move_to_end(session_id)
+            session.last_used = time.monotonic()
+
+        if self.store.persistent:
+            with self._store_lock:
+                stored = self.store.load(session_id)
+                if stored is not None and stored[3] != session.version:
+                    with self._lock:
+                        session.history, session.summary, session.documents, session.version = stored
+        return session
+
+    def add_turn(self, session: Session, prompt: str, reply: str):
+        """Records a completed exchange in a session's bounded history."""
+        self._update(session, lambda: session.add_turn(prompt, reply, self.max_history_turns))
+
+    def attach_document(self, session: Session, document: dict):
+        """Attaches an uploaded file to a session, unless the same content is already attached."""
+        def attach():
+            if any(attached["sha256"] == document["sha256"] for attached in session.documents):
+                return False
+            session.documents.append(document)
+
+        self._update(session, attach)
+
+    def _update(self, session: Session, change) -> bool:
+        """
+        Applies `change` to a session and saves it, reapplying it on top of the stored copy while
+        another worker's save gets in the way. Returns False, saving nothing, if `change` does.
+
+        Raises:
+            RuntimeError: If the session kept changing for `MAX_SAVE_ATTEMPTS` attempts.
+        """
+        with self._store_lock:
+            for attempt in range(MAX_SAVE_ATTEMPTS):
+                with self._lock:
+                    if change() is False:
+                        return False
+                    session.last_used = time.monotonic()
+                    state = (list(session.history), session.summary, list(session.documents))
+                version = self.store.save(session.session_id, *state, session.version)
+                if version is not None:
+                    session.version = version
+                    return True
+                time.sleep(random.uniform(0, SAVE_RETRY_DELAY * (attempt + 1)))
+                # A session missing from the store was evicted there, so it starts over empty.
+                stored = self.store.load(session.session_id) or ([], "", [], 0)
+                with self._lock:
+                    session.history, session.summary, session.documents, session.version = stored
+        raise RuntimeError(f"Could not save session {session.session_id}: it kept changing")
+
+    def turns_to_fold(self, session: Session) -> list:
+        """
+        Returns the oldest history entries that should be folded into the session's summary,
+        or an empty list while the history is within budget.
+        """
+        with self._lock:
+            turns = len(session.history) // 2
+            if turns <= self.keep_turns:
+                return []
+            over_budget = estimate_tokens(session.history) > self.history_token_budget
+            if not over_budget and turns < self.max_history_turns:
+                return []
+            return session.history[:2 * (turns - self.keep_turns)]
+
+    def fold(self, session: Session, folded: list, summary: str) -> bool:
+        """
+        Replaces the `folded` entries at the start of a session's history by `summary`.
+        Returns False, changing nothing, if those entries are no longer at the start.
+        """
+        def replace():
+            # Compared by value: after another worker's save the entries are reloaded copies.
+            if session.history[:len(folded)] != folded:
+                return False
+            del session.history[:len(folded)]
+            session.summary = summary
+
+        return self._update(session, replace)
+
+    def evict_idle(self) -> int:
+        """Drops sessions idle for longer than `idle_timeout`. Returns how many were dropped."""
+        with self._lock:
+            evicted = self._evict_idle(time.monotonic())
+        return max(evicted, self.store.evict_idle(self.idle_timeout))
+
+    def _evict_idle(self, now: float) -> int:
+        # Sessions are ordered by last use, so idle ones are at the front.
+        evicted = 0
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_used <= self.idle_timeout:
+                break
+            self._sessions.popitem(last=False)
+            evicted += 1
+        return evicted
+
+    def __len__(self):
+        stored = self.store.count()
+        return len(self._sessions) if stored is None else stored
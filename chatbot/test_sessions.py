@@ -0,0 +1,29 @@
+"""
+Regression check for sessions shared by several workers through the SQLite store: concurrent turns
+saved by different workers must all be kept. Each worker is a `SessionManager` with its own
+connection to one database file.
+
+    python -m pytest test_sessions.py
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from session_store import SQLiteSessionStore
+from sessions import SessionManager
+
+
+def test_concurrent_turns_from_several_workers_are_all_kept(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    workers = [SessionManager(max_history_turns=1000, store=SQLiteSessionStore(path)) for _ in range(4)]
+    session_id = workers[0].get().session_id
+
+    def add_turn(number):
+        worker = workers[number % len(workers)]
+        worker.add_turn(worker.get(session_id), f"question {number}", f"answer {number}")
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        for future in [executor.submit(add_turn, number) for number in range(200)]:
+            future.result()
+
+    history = SessionManager(max_history_turns=1000, store=SQLiteSessionStore(path)).get(session_id).history
+    prompts = sorted(entry["parts"][0] for entry in history if entry["role"] == "user")
+    assert prompts == sorted(f"question {number}" for number in range(200))
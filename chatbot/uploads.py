@@ -0,0 +1,197 @@
+import hashlib
+import os
+import re
+import uuid
+from pathlib import Path
+from typing import AsyncIterable, Iterable, Optional
+
+import aiofiles
+import aiofiles.os
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+SHA256_PATTERN = re.compile(r"[0-9a-f]{64}")
+# Room for the multipart boundaries, part headers and other form fields around the file.
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class UploadError(Exception):
+    """An upload the client has to fix, such as a file that is too large or of the wrong type."""
+
+
+class UploadStore:
+    """
+    Stores uploaded files under the SHA-256 of their content, as `<root>/<first 2 hex digits>/<hash>`,
+    so the same file uploaded twice is kept once. Files are written to `<root>/tmp` first and
+    moved into place when complete, so a stored file is never partial.
+    """
+
+    def __init__(self, root: str, max_size: int):
+        self.root = Path(root)
+        self.max_size = max_size
+        self.tmp_dir = self.root / "tmp"
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+
+    def path_for(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+
+    def find(self, digest: Optional[str]) -> Optional[Path]:
+        """Returns the path of the stored file with this SHA-256 hex digest, if there is one."""
+        if not digest or not SHA256_PATTERN.fullmatch(digest.lower()):
+            return None
+        path = self.path_for(digest.lower())
+        return path if path.is_file() else None
+
+    def writer(self) -> "UploadWriter":
+        return UploadWriter(self)
+
+
+class UploadWriter:
+    """Writes one upload to disk chunk by chunk, hashing it and enforcing the size limit as it goes."""
+
+    def __init__(self, store: UploadStore):
+        self.store = store
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._tmp_path = store.tmp_dir / uuid.uuid4().hex
+        self._file = None
+
+    async def write(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.size > self.store.max_size:
+            raise UploadError(f"File too large (max {self.store.max_size // (1024 * 1024)}MB)")
+        if self._file is None:
+            self._file = await aiofiles.open(self._tmp_path, "wb")
+        self._hash.update(chunk)
+        await self._file.write(chunk)
+
+    async def commit(self):
+        """
+        Moves the finished file to its content-addressed path.
+
+        Returns:
+            tuple[str, Path, bool]: The SHA-256 hex digest, the stored path and whether
+            an identical file was already stored.
+        """
+        if self._file is None:
+            self._file = await aiofiles.open(self._tmp_path, "wb")
+        await self._file.close()
+        digest = self._hash.hexdigest()
+        path = self.store.path_for(digest)
+        if path.is_file():
+            await aiofiles.os.remove(self._tmp_path)
+            return digest, path, True
+        path.parent.mkdir(exist_ok=True)
+        os.replace(self._tmp_path, path)
+        return digest, path, False
+
+    async def abort(self):
+        if self._file is not None:
+            await self._file.close()
+        if self._tmp_path.exists():
+            await aiofiles.os.remove(self._tmp_path)
+
+
+async def receive_upload(
+    body: AsyncIterable[bytes],
+    content_type: str,
+    store: UploadStore,
+    allowed_types: Iterable[str],
+    field_name: str = "file"
+) -> dict:
+    """
+    Parses a multipart/form-data request body as it arrives and streams the `field_name` file
+    part into `store`, so memory use stays constant however large the file is.
+
+    Args:
+        body (AsyncIterable[bytes]): The raw request body, e.g. `request.stream()`.
+        content_type (str): The request's Content-Type header, including the boundary.
+        store (UploadStore): Where to store the file.
+        allowed_types (Iterable[str]): Content types accepted for the file.
+        field_name (str): The form field holding the file.
+
+    Returns:
+        dict: The upload's "filename", "content_type", "size", "sha256", stored "path" and
+        whether it was "deduplicated".
+
+    Raises:
+        UploadError: If the request is not a valid upload, the file type is not allowed or the
+        file is larger than the store's limit.
+    """
+    mime_type, options = parse_options_header(content_type)
+    boundary = options.get(b"boundary")
+    if mime_type != b"multipart/form-data" or not boundary:
+        raise UploadError("Expected a multipart/form-data upload")
+
+    # The parser reports parts through callbacks; they are queued and handled after each
+    # chunk so the file can be written asynchronously.
+    events = []
+    header = {"field": b"", "value": b"", "headers": {}}
+
+    def on_header_field(data, start, end):
+        header["field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        header["value"] += data[start:end]
+
+    def on_header_end():
+        header["headers"][header["field"].lower()] = header["value"]
+        header["field"] = header["value"] = b""
+
+    def on_headers_finished():
+        events.append(("begin", header["headers"]))
+        header["headers"] = {}
+
+    def on_part_data(data, start, end):
+        events.append(("data", data[start:end]))
+
+    def on_part_end():
+        events.append(("end", None))
+
+    parser = MultipartParser(boundary, {
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    received = 0
+    writer = None
+    current = None
+    upload = None
+    try:
+        async for chunk in body:
+            received += len(chunk)
+            if received > store.max_size + MULTIPART_OVERHEAD:
+                raise UploadError(f"File too large (max {store.max_size // (1024 * 1024)}MB)")
+            try:
+                parser.write(chunk)
+            except MultipartParseError as e:
+                raise UploadError(f"Malformed upload: {e}")
+            for kind, value in events:
+                if kind == "begin":
+                    _, disposition = parse_options_header(value.get(b"content-disposition", b""))
+                    current = None
+                    if disposition.get(b"name", b"").decode("utf-8", "replace") == field_name and upload is None:
+                        part_type = value.get(b"content-type", b"application/octet-stream").decode("latin-1")
+                        if part_type not in allowed_types:
+                            raise UploadError("Unsupported file type")
+                        filename = disposition.get(b"filename", b"").decode("utf-8", "replace")
+                        current = {"filename": os.path.basename(filename), "content_type": part_type}
+                        writer = store.writer()
+                elif kind == "data" and current is not None:
+                    await writer.write(value)
+                elif kind == "end" and current is not None:
+                    digest, path, deduplicated = await writer.commit()
+                    upload = dict(current, size=writer.size, sha256=digest, path=str(path), deduplicated=deduplicated)
+                    current = writer = None
+            events.clear()
+    finally:
+        if writer is not None:
+            await writer.abort()
+
+    if upload is None:
+        raise UploadError(f"No file was uploaded in the '{field_name}' field")
+    return upload
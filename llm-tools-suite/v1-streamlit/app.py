@@ -1,11 +1,7 @@
 import streamlit as st
+import importlib
 import os
 import google.generativeai as genai
-from tools import blog_assistant
-from tools import data_analyzer
-from tools import sql_query_generator
-from tools import document_summarizer
-from tools import website_summarizer 
 
 gemini_api_key = os.getenv("GEMINI_API_KEY")
 
@@ -43,10 +39,13 @@ if 'messages' not in st.session_state:
     st.session_state.messages.append({"role": "assistant", "content": "Hello! I am an AI assistant designed to provide professional, concise, and accurate information. How may I assist you today?"})
 
 
+# Tool modules (and their dependencies such as pandas or LangChain) are only imported
+# when the tool is first opened, see `load_tool`.
 TOOLS = {
     "AI Assistant": {
         "icon": "🧠",
         "name": "AI Assistant",
+        "module": None,
         "function": None,
         "description": "Engage in a professional conversation with an AI assistant."
     },
@@ -54,39 +53,60 @@ TOOLS = {
     "Blog AI Assistant": {
         "icon": "📝",
         "name": "Blog AI Assistant",
-        "function": blog_assistant.blog_assistant_app,
+        "module": "tools.blog_assistant",
+        "function": "blog_assistant_app",
         "description": "Generate engaging blog posts with AI assistance."
     },
 
     "AI CSV Analyzer": {
         "icon": "📊",
         "name": "AI CSV Analyzer",
-        "function": data_analyzer.data_analyzer_app,
+        "module": "tools.data_analyzer",
+        "function": "data_analyzer_app",
         "description": "Upload and analyze your CSV data using AI."
     },
 
     "SQL Query Generator": {
         "icon": "💻",
         "name": "SQL Query Generator",
-        "function": sql_query_generator.sql_query_generator_app,
+        "module": "tools.sql_query_generator",
+        "function": "sql_query_generator_app",
         "description": "Generate SQL queries from natural language descriptions."
     },
 
     "Document Summarizer": {
         "icon": "📄",
         "name": "Document Summarizer",
-        "function": document_summarizer.document_summarizer_app,
+        "module": "tools.document_summarizer",
+        "function": "document_summarizer_app",
         "description": "Summarize PDF and Word documents instantly."
     },
 
     "Website Summarizer": {
         "icon": "🌐",
         "name": "Website Summarizer",
-        "function": website_summarizer.website_summarizer_app,
+        "module": "tools.website_summarizer",
+        "function": "website_summarizer_app",
         "description": "Summarize web pages by providing a URL."
     },
 }
 
+
+def load_tool(tool_info):
+    """
+    Imports a tool's module on first use and returns its app function.
+    Python caches imported modules, so later reruns only pay for a dictionary lookup.
+
+    Args:
+        tool_info (dict): An entry of `TOOLS`.
+
+    Returns:
+        Callable[[], None]: The function that renders the tool.
+    """
+    module = importlib.import_module(tool_info["module"])
+    return getattr(module, tool_info["function"])
+
+
 st.set_page_config(
     page_title="LLM Tools Suite",
     layout="wide",
@@ -162,7 +182,7 @@ if selected_tool_name == "AI Assistant":
 
 else:
     selected_tool_info = TOOLS[selected_tool_name]
-    selected_tool_function = selected_tool_info["function"]
+    selected_tool_function = load_tool(selected_tool_info)
     selected_tool_description = selected_tool_info["description"]
 
     st.title(f"{selected_tool_info['icon']} {selected_tool_name}")
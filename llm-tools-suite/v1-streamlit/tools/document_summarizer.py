@@ -1,8 +1,29 @@
 import streamlit as st
-from .document_summarizer_utils import summerizer
+from .document_summarizer_knowledge_base import file_hash
+from .document_summarizer_utils import summerizer, load_knowledge_base, answer_question, warm_up, SUMMARY_MODES
+
+# Number of documents whose knowledge bases are kept in memory for Q&A, shared by all sessions.
+QA_MAX_DOCUMENTS = 16
+
+
+@st.cache_resource(show_spinner=False, max_entries=QA_MAX_DOCUMENTS)
+def get_knowledge_base(doc_hash, _doc_file):
+    """
+    Loads or builds a document's knowledge base once per file hash and keeps it in memory,
+    so follow-up questions skip extraction and embedding. Errors are raised rather than
+    returned so they are not cached.
+    """
+    KnowledgeBase, error = load_knowledge_base(_doc_file, doc_hash)
+    if error:
+        raise ValueError(error)
+    return KnowledgeBase
+
 
 def document_summarizer_app():
-    st.write('Summarize your PDF or Word files efficiently.')
+    # Load LangChain and the Gemini clients in the background while the page renders.
+    warm_up()
+
+    st.write('Summarize your PDF or Word files efficiently, then ask questions about them.')
     st.markdown("---")
 
     doc_file = st.file_uploader('Upload your PDF or Word Document...', type=['pdf', 'docx'], key="doc_summarizer_uploader")
@@ -10,28 +31,76 @@ def document_summarizer_app():
     if 'doc_summary_output' not in st.session_state:
         st.session_state.doc_summary_output = ""
 
-    submit = st.button('Generate Summary', type="primary")
+    summary_tab, qa_tab = st.tabs(['Summary', 'Q&A'])
 
-    if submit:
-        if doc_file is not None:
-            with st.spinner("Analyzing document and generating summary... This might take a moment."):
-                response = summerizer(doc_file)
+    with summary_tab:
+        mode = st.radio(
+            'Summarization mode',
+            list(SUMMARY_MODES),
+            format_func=SUMMARY_MODES.get,
+            horizontal=True,
+            key="doc_summarizer_mode"
+        )
+        max_workers = 4
+        if mode == 'map_reduce':
+            max_workers = st.slider('Parallel LLM calls', min_value=1, max_value=16, value=4, key="doc_summarizer_workers")
+
+        refresh = st.checkbox('Regenerate (ignore cached summary)', key="doc_summarizer_refresh")
+        submit = st.button('Generate Summary', type="primary")
+
+        if submit:
+            if doc_file is not None:
+                with st.spinner("Analyzing document and generating summary... This might take a moment."):
+                    response = summerizer(doc_file, mode=mode, max_workers=max_workers, refresh=refresh)
             
-            if response:
-                st.subheader('Generated Summary:')
-                st.info(response)
-                st.session_state.doc_summary_output = response
+                if response:
+                    st.subheader('Generated Summary:')
+                    st.info(response)
+                    st.session_state.doc_summary_output = response
+                else:
+                    st.warning("Could not generate a summary. Please check the document content or try again.")
+                    st.session_state.doc_summary_output = ""
             else:
-                st.warning("Could not generate a summary. Please check the document content or try again.")
-                st.session_state.doc_summary_output = ""
+                st.warning("Please upload a PDF or Word document to begin summarization.")
+
+        if st.session_state.doc_summary_output:
+            st.download_button(
+                label="Download Summary as Text",
+                data=st.session_state.doc_summary_output,
+                file_name="document_summary.txt",
+                mime="text/plain",
+                help="Click to download the generated summary as a plain text file."
+            )
+
+    with qa_tab:
+        document_qa(doc_file)
+
+
+def document_qa(doc_file):
+    if doc_file is None:
+        st.info("Upload a PDF or Word document to ask questions about it.")
+        return
+
+    doc_hash = file_hash(doc_file)
+    history = st.session_state.setdefault('doc_qa_history', {}).setdefault(doc_hash, [])
+
+    for question, answer in history:
+        st.markdown(f"**Q:** {question}")
+        st.info(answer)
+
+    with st.form('doc_qa_form', clear_on_submit=True):
+        question = st.text_input('Ask a question about the document', key="doc_qa_question")
+        ask = st.form_submit_button('Ask', type="primary")
+
+    if ask:
+        if question.strip():
+            with st.spinner("Searching the document..."):
+                try:
+                    answer = answer_question(get_knowledge_base(doc_hash, doc_file), question)
+                except ValueError as e:
+                    answer = str(e)
+            history.append((question, answer))
+            st.markdown(f"**Q:** {question}")
+            st.info(answer)
         else:
-            st.warning("Please upload a PDF or Word document to begin summarization.")
-
-    if st.session_state.doc_summary_output:
-        st.download_button(
-            label="Download Summary as Text",
-            data=st.session_state.doc_summary_output,
-            file_name="document_summary.txt",
-            mime="text/plain",
-            help="Click to download the generated summary as a plain text file."
-        )
+            st.warning("Please enter a question.")
@@ -0,0 +1,166 @@
+import io
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from docx import Document
+from docx.table import Table
+from docx.text.paragraph import Paragraph
+from pypdf import PdfReader, errors as pypdf_errors
+
+
+logger = logging.getLogger(__name__)
+
+# PDFs with fewer pages than this are extracted serially; a process pool is not worth starting for them.
+PARALLEL_MIN_PAGES = 32
+PAGES_PER_TASK = 8
+# Pages that take longer than this to extract are logged so pathological pages can be spotted.
+SLOW_PAGE_SECONDS = 2.0
+
+_worker_reader = None
+
+
+class ExtractionError(Exception):
+    """Raised when a document cannot be read. The message is safe to show to the user."""
+
+
+def _extract_page(page):
+    try:
+        return page.extract_text() or ''
+    except pypdf_errors.PdfStreamError:
+        raise ExtractionError("Could not read PDF. The file might be corrupted or malformed.")
+    except Exception as e:
+        raise ExtractionError(f"An unexpected error occurred while processing the PDF: {e}")
+
+
+def _init_pdf_worker(data):
+    global _worker_reader
+    _worker_reader = PdfReader(io.BytesIO(data))
+
+
+def _extract_page_range(start, stop):
+    results = []
+    for index in range(start, stop):
+        started = time.perf_counter()
+        text = _extract_page(_worker_reader.pages[index])
+        results.append((index, text, time.perf_counter() - started))
+    return results
+
+
+def _read_all(pdf_file):
+    if hasattr(pdf_file, 'getvalue'):
+        return pdf_file.getvalue()
+    pdf_file.seek(0)
+    return pdf_file.read()
+
+
+def iter_pdf_pages(pdf_file, max_workers=1):
+    """
+    Extracts text from a PDF file one page at a time.
+
+    When `max_workers` is greater than 1 and the PDF has at least `PARALLEL_MIN_PAGES` pages,
+    page ranges are extracted on a process pool and reassembled in page order.
+
+    Args:
+        pdf_file: A binary file-like object, e.g. a Streamlit `UploadedFile`.
+        max_workers (int): Number of extraction processes to use for large PDFs.
+
+    Yields:
+        dict: One record per page with keys "kind" ("page"), "index" (0-based page number),
+        "offset" (character offset of the page in the whole document), "text" and
+        "seconds" (time spent extracting the page).
+
+    Raises:
+        ExtractionError: If the PDF cannot be read.
+    """
+    try:
+        pdf_reader = PdfReader(pdf_file)
+        page_count = len(pdf_reader.pages)
+    except pypdf_errors.PdfStreamError:
+        raise ExtractionError("Could not read PDF. The file might be corrupted or malformed.")
+    except Exception as e:
+        raise ExtractionError(f"An unexpected error occurred while processing the PDF: {e}")
+
+    if max_workers > 1 and page_count >= PARALLEL_MIN_PAGES:
+        pages = _iter_pages_parallel(_read_all(pdf_file), page_count, max_workers)
+    else:
+        pages = _iter_pages_serial(pdf_reader)
+
+    offset = 0
+    for index, text, seconds in pages:
+        if seconds > SLOW_PAGE_SECONDS:
+            logger.warning("PDF page %d took %.1fs to extract", index + 1, seconds)
+        yield {"kind": "page", "index": index, "offset": offset, "text": text, "seconds": seconds}
+        offset += len(text)
+
+
+def _iter_pages_serial(pdf_reader):
+    for index, page in enumerate(pdf_reader.pages):
+        started = time.perf_counter()
+        text = _extract_page(page)
+        yield index, text, time.perf_counter() - started
+
+
+def _iter_pages_parallel(data, page_count, max_workers):
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=_init_pdf_worker,
+        initargs=(data,)
+    ) as executor:
+        futures = [
+            executor.submit(_extract_page_range, start, min(start + PAGES_PER_TASK, page_count))
+            for start in range(0, page_count, PAGES_PER_TASK)
+        ]
+        try:
+            for future in futures:
+                yield from future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+def _table_text(table):
+    rows = []
+    for row in table.rows:
+        cells = []
+        for cell in row.cells:
+            # Merged cells are returned once per grid column they span.
+            if not cells or cells[-1]._tc is not cell._tc:
+                cells.append(cell)
+        rows.append(" | ".join(cell.text.strip() for cell in cells))
+    return "\n".join(rows)
+
+
+def iter_docx_blocks(docx_file):
+    """
+    Extracts text from a DOCX (Word) file one block at a time, in document order.
+    Paragraphs and tables are both included; each table row becomes one line with cells separated by " | ".
+
+    Args:
+        docx_file: A binary file-like object, e.g. a Streamlit `UploadedFile`.
+
+    Yields:
+        dict: One record per block with keys "kind" ("paragraph" or "table"), "index" (0-based block number),
+        "offset" (character offset of the block in the whole document) and "text".
+
+    Raises:
+        ExtractionError: If the document cannot be read.
+    """
+    try:
+        document = Document(docx_file)
+        body = document.element.body
+    except Exception as e:
+        raise ExtractionError(f"An error occurred while processing the Word document: {e}")
+
+    offset = 0
+    index = 0
+    for child in body.iterchildren():
+        if child.tag.endswith('}p'):
+            kind, text = "paragraph", Paragraph(child, document).text + '\n'
+        elif child.tag.endswith('}tbl'):
+            kind, text = "table", _table_text(Table(child, document)) + '\n'
+        else:
+            continue
+        yield {"kind": kind, "index": index, "offset": offset, "text": text}
+        offset += len(text)
+        index += 1
@@ -0,0 +1,104 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from .document_summarizer_chunking import count_tokens
+
+MAP_PROMPT = """Write a concise summary of the following part of a longer document.
+Keep names, figures, dates and conclusions. Use at most {max_words} words.
+
+{text}
+
+CONCISE SUMMARY:"""
+
+REDUCE_PROMPT = """The following are summaries of consecutive parts of one document.
+Merge them into a single summary that preserves their order and key facts. Use at most {max_words} words.
+
+{text}
+
+MERGED SUMMARY:"""
+
+FINAL_PROMPT = """The following are summaries covering an entire document, in order.
+{instruction}
+
+{text}
+
+SUMMARY:"""
+
+
+def group_by_tokens(texts, token_budget):
+    """
+    Packs consecutive texts into groups whose combined size stays within a token budget.
+    A single text larger than the budget gets a group of its own.
+
+    Args:
+        texts (list[str]): The texts to group, in document order.
+        token_budget (int): Maximum estimated tokens per group.
+
+    Returns:
+        list[list[str]]: The groups, in document order.
+    """
+    groups = []
+    current = []
+    current_tokens = 0
+    for text in texts:
+        tokens = count_tokens(text)
+        if current and current_tokens + tokens > token_budget:
+            groups.append(current)
+            current = []
+            current_tokens = 0
+        current.append(text)
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+
+def _summarize_groups(llm, prompt, groups, max_words, max_workers):
+    def summarize(group):
+        response = llm.invoke(prompt.format(text="\n\n".join(group), max_words=max_words))
+        return response.content
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(summarize, groups))
+
+
+def map_reduce_summarize(
+    chunks,
+    llm,
+    instruction,
+    max_workers=4,
+    map_token_budget=8000,
+    reduce_token_budget=8000,
+    map_summary_words=200,
+    reduce_summary_words=300,
+):
+    """
+    Summarizes a whole document by summarizing groups of chunks concurrently (map), then
+    repeatedly merging the partial summaries level by level (reduce) until they fit in one final call.
+
+    Args:
+        chunks (list[str]): The document chunks, in document order.
+        llm: A LangChain chat model such as `ChatGoogleGenerativeAI`.
+        instruction (str): What the final summary should look like, e.g. its length.
+        max_workers (int): Maximum number of concurrent LLM calls at each level.
+        map_token_budget (int): Maximum estimated input tokens per map call.
+        reduce_token_budget (int): Maximum estimated input tokens per reduce call and for the final call.
+        map_summary_words (int): Length limit given to the model for each map summary.
+        reduce_summary_words (int): Length limit given to the model for each intermediate merged summary.
+
+    Returns:
+        str: The final summary.
+    """
+    groups = group_by_tokens(chunks, map_token_budget)
+    summaries = _summarize_groups(llm, MAP_PROMPT, groups, map_summary_words, max_workers)
+
+    while len(summaries) > 1:
+        groups = group_by_tokens(summaries, reduce_token_budget)
+        if len(groups) == 1:
+            break
+        if len(groups) == len(summaries):
+            # Every summary fills the budget on its own; merge pairs so each level still shrinks.
+            groups = [summaries[i:i + 2] for i in range(0, len(summaries), 2)]
+        summaries = _summarize_groups(llm, REDUCE_PROMPT, groups, reduce_summary_words, max_workers)
+
+    response = llm.invoke(FINAL_PROMPT.format(instruction=instruction, text="\n\n".join(summaries)))
+    return response.content
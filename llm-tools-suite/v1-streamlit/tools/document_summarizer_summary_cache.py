@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class SummaryCache:
+    """
+    A two-tier cache of finished summaries: an in-process LRU in front of a SQLite table.
+
+    Entries are keyed by the document's content hash together with everything that changes the
+    output (query, mode, model name and temperature) and expire after `ttl_seconds`.
+    """
+
+    def __init__(self, path, max_memory_entries=256, ttl_seconds=7 * 24 * 3600):
+        """
+        Args:
+            path (str): Location of the SQLite database file. Parent folders are created if needed.
+            max_memory_entries (int): Number of summaries kept in the in-process LRU tier.
+            ttl_seconds (float): How long a summary stays valid in either tier.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.max_memory_entries = max_memory_entries
+        self.ttl_seconds = ttl_seconds
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS summaries ("
+            " key TEXT PRIMARY KEY,"
+            " doc_hash TEXT NOT NULL,"
+            " summary TEXT NOT NULL,"
+            " expires_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS summaries_doc_hash ON summaries (doc_hash)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(doc_hash, query, model_name, temperature, mode="retrieval"):
+        """
+        Builds the cache key for one summarization request.
+
+        Args:
+            doc_hash (str): The content hash of the document.
+            query (str): The summarization query or instruction.
+            model_name (str): The LLM model name.
+            temperature (float): The LLM sampling temperature.
+            mode (str): The summarization mode.
+
+        Returns:
+            str: A hex SHA-256 digest.
+        """
+        payload = json.dumps([doc_hash, query, model_name, float(temperature), mode])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """
+        Looks up a summary, checking the in-process tier first and promoting disk hits into it.
+
+        Args:
+            key (str): A key produced by `make_key`.
+
+        Returns:
+            str | None: The cached summary, or None on a miss or if the entry has expired.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                doc_hash, summary, expires_at = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    return summary
+                del self._memory[key]
+
+            row = self._conn.execute(
+                "SELECT doc_hash, summary, expires_at FROM summaries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            doc_hash, summary, expires_at = row
+            if expires_at <= now:
+                self._conn.execute("DELETE FROM summaries WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._remember(key, (doc_hash, summary, expires_at))
+            return summary
+
+    def put(self, key, doc_hash, summary):
+        """
+        Stores a summary in both tiers.
+
+        Args:
+            key (str): A key produced by `make_key`.
+            doc_hash (str): The content hash of the document, used for invalidation.
+            summary (str): The summary text.
+        """
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._remember(key, (doc_hash, summary, expires_at))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO summaries (key, doc_hash, summary, expires_at) VALUES (?, ?, ?, ?)",
+                (key, doc_hash, summary, expires_at),
+            )
+            self._conn.execute("DELETE FROM summaries WHERE expires_at <= ?", (time.time(),))
+            self._conn.commit()
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def invalidate(self, doc_hash=None):
+        """
+        Drops cached summaries from both tiers.
+
+        Args:
+            doc_hash (str | None): Only drop summaries of this document. Drops everything if None.
+        """
+        with self._lock:
+            if doc_hash is None:
+                self._memory.clear()
+                self._conn.execute("DELETE FROM summaries")
+            else:
+                for key in [key for key, entry in self._memory.items() if entry[0] == doc_hash]:
+                    del self._memory[key]
+                self._conn.execute("DELETE FROM summaries WHERE doc_hash = ?", (doc_hash,))
+            self._conn.commit()
@@ -0,0 +1,133 @@
+import math
+
+import faiss
+import numpy as np
+
+# How vectors are stored: full float32 ("flat"), half precision ("float16", 2x smaller) or
+# product-quantized ("pq", one byte per PQ_SUBVECTOR_DIMS dimensions, 32x smaller for 768-d vectors).
+INDEX_TYPES = ("flat", "float16", "pq")
+PQ_SUBVECTOR_DIMS = 8
+# PQ codebooks have PQ_CENTROIDS centroids per sub-vector and need enough vectors to train them;
+# smaller knowledge bases fall back to float16 storage.
+PQ_MIN_VECTORS = 1024
+PQ_CENTROIDS = 256
+# FAISS needs about this many training vectors per IVF partition or PQ centroid to cluster well;
+# training on more only makes building slower.
+TRAINING_VECTORS_PER_CENTROID = 39
+
+
+def index_description(index_type, dimension, vector_count, ivf_min_vectors):
+    """
+    Chooses the FAISS index layout for a knowledge base.
+
+    Args:
+        index_type (str): One of `INDEX_TYPES`.
+        dimension (int): The embedding dimension.
+        vector_count (int): How many vectors the index will hold.
+        ivf_min_vectors (int): Partition the index with IVF from this many vectors on.
+
+    Returns:
+        str: A `faiss.index_factory` description such as "Flat", "SQfp16" or "IVF512,PQ96".
+
+    Raises:
+        ValueError: If `index_type` is not one of `INDEX_TYPES`.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type!r}, expected one of {', '.join(INDEX_TYPES)}")
+
+    if index_type == "flat":
+        encoding = "Flat"
+    elif index_type == "float16" or vector_count < PQ_MIN_VECTORS:
+        encoding = "SQfp16"
+    else:
+        # The number of sub-quantizers has to divide the dimension.
+        sub_quantizers = next(m for m in range(max(1, dimension // PQ_SUBVECTOR_DIMS), 0, -1) if dimension % m == 0)
+        encoding = f"PQ{sub_quantizers}"
+
+    if vector_count >= ivf_min_vectors:
+        # About 4 * sqrt(n) partitions, as long as each one still gets enough training vectors.
+        partitions = max(1, min(int(4 * math.sqrt(vector_count)), vector_count // TRAINING_VECTORS_PER_CENTROID))
+        return f"IVF{partitions},{encoding}"
+    return encoding
+
+
+def build_index(vectors, index_type="flat", ivf_min_vectors=20000, nprobe=16):
+    """
+    Creates a FAISS index of the requested type, trains it if needed and adds the vectors in order,
+    so vector `i` gets id `i` (as LangChain's `FAISS` vector store expects).
+
+    Args:
+        vectors (np.ndarray): A (count, dimension) array of embeddings.
+        index_type (str): One of `INDEX_TYPES`.
+        ivf_min_vectors (int): Partition the index with IVF from this many vectors on.
+        nprobe (int): Number of IVF partitions searched per query.
+
+    Returns:
+        faiss.Index: The filled index.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    count, dimension = vectors.shape
+    index = faiss.index_factory(dimension, index_description(index_type, dimension, count, ivf_min_vectors))
+    if not index.is_trained:
+        ivf = faiss.try_extract_index_ivf(index)
+        training_size = TRAINING_VECTORS_PER_CENTROID * max(PQ_CENTROIDS, ivf.nlist if ivf is not None else 0)
+        if count > training_size:
+            sample = np.random.default_rng(0).choice(count, training_size, replace=False)
+            index.train(vectors[np.sort(sample)])
+        else:
+            index.train(vectors)
+    index.add(vectors)
+    set_nprobe(index, nprobe)
+    return index
+
+
+def set_nprobe(index, nprobe):
+    """
+    Sets how many IVF partitions are searched per query. Has no effect on unpartitioned indexes.
+    The setting is saved with the index.
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(nprobe, ivf.nlist)
+
+
+def is_partitioned(index):
+    """
+    Tells whether an index is IVF-partitioned. IVF indexes keep vector ids stable when vectors are
+    removed, unlike the flat layouts LangChain's `FAISS.delete` assumes, so they are rebuilt
+    rather than updated in place.
+    """
+    return faiss.try_extract_index_ivf(index) is not None
+
+
+def index_size_bytes(index):
+    """
+    Returns the size of an index when serialized, which is also roughly what it occupies in memory.
+    """
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def compact_knowledge_base(knowledge_base, index_type="flat", ivf_min_vectors=20000, nprobe=16):
+    """
+    Replaces the float32 flat index of a freshly built FAISS vector store with a more compact one.
+
+    Only exact flat indexes are converted, because their vectors can be read back losslessly;
+    knowledge bases that are already compact are returned unchanged.
+
+    Args:
+        knowledge_base (FAISS): The vector store to compact.
+        index_type (str): One of `INDEX_TYPES`.
+        ivf_min_vectors (int): Partition the index with IVF from this many vectors on.
+        nprobe (int): Number of IVF partitions searched per query.
+
+    Returns:
+        FAISS: The same vector store, now backed by the compact index.
+    """
+    index = knowledge_base.index
+    if not isinstance(index, faiss.IndexFlat) or index.ntotal == 0:
+        return knowledge_base
+    if index_description(index_type, index.d, index.ntotal, ivf_min_vectors) == "Flat":
+        return knowledge_base
+
+    knowledge_base.index = build_index(index.reconstruct_n(0, index.ntotal), index_type, ivf_min_vectors, nprobe)
+    return knowledge_base
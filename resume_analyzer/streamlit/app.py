@@ -1,11 +1,11 @@
 import streamlit as st
 import google.generativeai as genai
 from pathlib import Path
-import PyPDF2
 import docx
 import io
 import json
 import os
+from pdf_extraction import extract_text_from_pdf_bytes
 
 # Page configuration
 st.set_page_config(
@@ -279,11 +279,7 @@ if 'analysis_result' not in st.session_state:
 # Helper functions
 def extract_text_from_pdf(file):
     """Extract text from PDF file"""
-    pdf_reader = PyPDF2.PdfReader(io.BytesIO(file.read()))
-    text = ""
-    for page in pdf_reader.pages:
-        text += page.extract_text()
-    return text
+    return extract_text_from_pdf_bytes(file.read())
 
 def extract_text_from_docx(file):
     """Extract text from DOCX file"""
@@ -0,0 +1,70 @@
+import io
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import PyPDF2
+
+logger = logging.getLogger(__name__)
+
+# Number of processes used to extract pages from large PDFs.
+PDF_EXTRACTION_WORKERS = int(os.getenv("RESUME_PDF_WORKERS", str(os.cpu_count() or 1)))
+# PDFs with fewer pages than this are extracted serially; a process pool is not worth starting for them.
+PARALLEL_MIN_PAGES = 32
+PAGES_PER_TASK = 8
+# Pages that take longer than this to extract are logged so pathological pages can be spotted.
+SLOW_PAGE_SECONDS = 2.0
+
+_worker_reader = None
+
+
+def _init_worker(data):
+    global _worker_reader
+    _worker_reader = PyPDF2.PdfReader(io.BytesIO(data))
+
+
+def _extract_page_range(start, stop):
+    results = []
+    for index in range(start, stop):
+        started = time.perf_counter()
+        text = _worker_reader.pages[index].extract_text() or ""
+        results.append((index, text, time.perf_counter() - started))
+    return results
+
+
+def extract_pdf_pages(data, max_workers=PDF_EXTRACTION_WORKERS):
+    """
+    Extract text from every page of a PDF, in page order.
+
+    Large PDFs are split into page ranges that are extracted on a process pool.
+
+    Returns a list of (page_index, text, seconds) tuples, where seconds is the
+    time spent extracting that page.
+    """
+    reader = PyPDF2.PdfReader(io.BytesIO(data))
+    page_count = len(reader.pages)
+
+    if max_workers <= 1 or page_count < PARALLEL_MIN_PAGES:
+        pages = []
+        for index, page in enumerate(reader.pages):
+            started = time.perf_counter()
+            text = page.extract_text() or ""
+            pages.append((index, text, time.perf_counter() - started))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(data,)) as executor:
+            futures = [
+                executor.submit(_extract_page_range, start, min(start + PAGES_PER_TASK, page_count))
+                for start in range(0, page_count, PAGES_PER_TASK)
+            ]
+            pages = [page for future in futures for page in future.result()]
+
+    for index, _, seconds in pages:
+        if seconds > SLOW_PAGE_SECONDS:
+            logger.warning("PDF page %d took %.1fs to extract", index + 1, seconds)
+    return pages
+
+
+def extract_text_from_pdf_bytes(data, max_workers=PDF_EXTRACTION_WORKERS):
+    """Extract the text of a PDF given its raw bytes"""
+    return "".join(text for _, text, _ in extract_pdf_pages(data, max_workers))